@@ -0,0 +1,318 @@
+import argparse
+import json
+import logging
+import math
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from runlog import RunLog
+
+STROKE_DTYPE = np.dtype([
+    ('start', '<f8'),                # s, when the load left the previous end of the stroke
+    ('end', '<f8'),                  # s, when it reached this end
+    ('direction', 'i1'),             # +1 toward +DELTA, -1 back toward 0
+    ('amplitude', '<f8'),            # Units travelled by the load
+    ('motor_amplitude', '<f8'),      # Units travelled by the motor (NaN without a motor series)
+    ('end_position', '<f8'),         # Units, load position at the end of the stroke
+    ('drift', '<f8'),                # Units, end position minus the first end position in the same direction
+    ('duration', '<f8'),             # s, start to end
+    ('period', '<f8'),               # s, end of this stroke minus the end two strokes earlier (NaN for the first two)
+    ('peak_velocity', '<f8'),        # Units/s
+    ('peak_acceleration', '<f8'),    # Units/s^2
+    ('following_error_rms', '<f8'),  # Units (NaN without a following error series)
+    ('following_error_max', '<f8'),
+])
+HARMONICS = 5
+LINE_BINS = 2
+HANN_NOISE_BANDWIDTH = 1.5  # bins
+
+
+def resample(times: np.ndarray, values: np.ndarray, grid: np.ndarray) -> np.ndarray:
+    # Telemetry timestamps are not exactly periodic; everything is analyzed on one uniform grid.
+    return np.interp(grid, times, values)
+
+
+def moving_average(values: np.ndarray, width: int) -> np.ndarray:
+    # Centred box filter through a cumulative sum, O(n) whatever the width; the ends are padded
+    # with the first and last values.
+    if width <= 1:
+        return values
+    half = width // 2
+    total = np.concatenate(([0.0], np.cumsum(np.pad(values, (half, width - 1 - half), mode='edge'))))
+    return (total[width:] - total[:-width]) / width
+
+
+def half_cycles(position: np.ndarray, hysteresis: float = 0.25) -> Tuple[np.ndarray, np.ndarray]:
+    # Splits the series into half-cycles with a Schmitt trigger at hysteresis of the range from each end:
+    # the side of the envelope each one visits (+1 top, -1 bottom) and the index it starts at.
+    empty = np.zeros(0, dtype=np.int64)
+    if len(position) < 2:
+        return empty, empty
+    low, high = np.percentile(position, [5, 95])
+    span = high - low
+    if span <= 0:
+        return empty, empty
+    side = np.zeros(len(position), dtype=np.int8)
+    side[position >= high - hysteresis * span] = 1
+    side[position <= low + hysteresis * span] = -1
+    # Forward-fill the samples between the thresholds with the last side visited
+    index = np.where(side != 0, np.arange(len(side)), 0)
+    np.maximum.accumulate(index, out=index)
+    side = side[index]
+    starts = np.concatenate(([0], np.flatnonzero(np.diff(side)) + 1))
+    starts = starts[side[starts] != 0]
+    return side[starts].astype(np.int64), starts
+
+
+def extremes(values: np.ndarray, sides: np.ndarray, starts: np.ndarray,
+             tolerance: float = 0.02) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # The extreme of every half-cycle, with the first and last samples within tolerance Units of it
+    # (arrival and departure), so the dwell between strokes belongs to neither stroke.
+    if len(starts) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, empty, np.zeros(0)
+    lengths = np.diff(np.concatenate((starts, [len(values)])))
+    # Flip the bottom half-cycles so both extremes are maxima
+    signed = values[starts[0]:] * np.repeat(sides, lengths)
+    offsets = starts - starts[0]
+    extreme = np.maximum.reduceat(signed, offsets)
+    segment = np.repeat(np.arange(len(offsets)), lengths)
+    near = np.flatnonzero(signed >= extreme[segment] - tolerance)
+    boundaries = np.flatnonzero(np.diff(segment[near])) + 1
+    arrival = near[np.concatenate(([0], boundaries))] + starts[0]
+    departure = near[np.concatenate((boundaries - 1, [len(near) - 1]))] + starts[0]
+    return arrival, departure, extreme * sides
+
+
+def _segment_reduce(ufunc, values: np.ndarray, begin: np.ndarray, end: np.ndarray) -> np.ndarray:
+    # ufunc over values[begin[i]:end[i] + 1] for every i, in one reduceat over interleaved bounds
+    bounds = np.column_stack((begin, end + 1)).ravel()
+    if bounds[-1] >= len(values):
+        values = np.concatenate((values, values[-1:]))
+    return ufunc.reduceat(values, bounds)[::2]
+
+
+def flow_spectrum(velocity: np.ndarray, rate: float, segment: float = 60.0,
+                  block: int = 64) -> Tuple[np.ndarray, np.ndarray]:
+    # Amplitude spectrum (Units/s per bin) of the piston velocity, which the flow follows: Hann-windowed
+    # segments averaged in power (Welch), transformed a block of segments at a time to bound memory.
+    # Segments of a power of two samples, which the FFT handles fastest
+    length = min(len(velocity), 1 << max(int(round(math.log2(max(segment * rate, 2)))), 1))
+    count = len(velocity) // length
+    if count == 0:
+        return np.zeros(0), np.zeros(0)
+    window = np.hanning(length)
+    power = np.zeros(length // 2 + 1)
+    frames = velocity[:count * length].reshape(count, length)
+    for first in range(0, count, block):
+        chunk = frames[first:first + block]
+        chunk = (chunk - chunk.mean(axis=1, keepdims=True)) * window
+        power += (np.abs(np.fft.rfft(chunk, axis=1)) ** 2).sum(axis=0)
+    amplitude = np.sqrt(power / count) * 2 / window.sum()
+    return np.fft.rfftfreq(length, 1.0 / rate), amplitude
+
+
+class RunAnalysis:
+    # Motion quality of one run from its motor position, load position and following error series, each
+    # a (times in s, values in Units) pair. The load is the piston; without it the motor stands in for it.
+
+    def __init__(self, motor: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                 load: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+                 following_error: Optional[Tuple[np.ndarray, np.ndarray]] = None, rate: Optional[float] = None,
+                 smoothing: float = 0.05, hysteresis: float = 0.25, tolerance: float = 0.02,
+                 segment: float = 60.0) -> None:
+        series = {name: (np.asarray(values[0], dtype=np.float64), np.asarray(values[1], dtype=np.float64))
+                  for name, values in (('motor', motor), ('load', load), ('following_error', following_error))
+                  if values is not None}
+        if not series:
+            raise ValueError(" Need a motor or load position series to analyze")
+        piston_times, _ = series['load'] if 'load' in series else series['motor']
+        if len(piston_times) < 2:
+            raise ValueError(" Need at least two position samples to analyze")
+        if rate is None:
+            step = np.median(np.diff(piston_times))
+            rate = 1.0 / step if step > 0 else 1.0
+        self.rate = rate
+        self.start_time = float(piston_times[0])
+        duration = float(piston_times[-1]) - self.start_time
+        grid = self.start_time + np.arange(int(duration * rate) + 1) / rate
+        self.samples = len(grid)
+        self.duration = duration
+        resampled = {name: resample(t, v, grid) for name, (t, v) in series.items()}
+        piston = resampled['load'] if 'load' in resampled else resampled['motor']
+
+        width = max(int(round(smoothing * rate)), 1)
+        velocity = np.gradient(moving_average(piston, width), 1.0 / rate) if len(piston) > 1 else np.zeros(len(piston))
+        acceleration = (np.gradient(moving_average(velocity, width), 1.0 / rate)
+                        if len(velocity) > 1 else np.zeros(len(velocity)))
+
+        sides, starts = half_cycles(piston, hysteresis)
+        arrival, departure, ends = extremes(piston, sides, starts, tolerance)
+        count = max(len(sides) - 1, 0)
+        strokes = np.zeros(count, dtype=STROKE_DTYPE)
+        if count:
+            begin, end = departure[:-1], arrival[1:]
+            strokes['start'] = grid[begin] - self.start_time
+            strokes['end'] = grid[end] - self.start_time
+            strokes['direction'] = sides[1:]
+            strokes['amplitude'] = np.abs(np.diff(ends))
+            strokes['end_position'] = ends[1:]
+            strokes['duration'] = strokes['end'] - strokes['start']
+            strokes['period'] = np.nan
+            strokes['period'][2:] = strokes['end'][2:] - strokes['end'][:-2]
+            strokes['peak_velocity'] = _segment_reduce(np.maximum, np.abs(velocity), begin, end)
+            strokes['peak_acceleration'] = _segment_reduce(np.maximum, np.abs(acceleration), begin, end)
+            for direction in (1, -1):
+                mask = strokes['direction'] == direction
+                if mask.any():
+                    strokes['drift'][mask] = strokes['end_position'][mask] - strokes['end_position'][mask][0]
+            if 'motor' in resampled:
+                # The motor's own extremes in the same half-cycles; it reverses before the load with backlash.
+                strokes['motor_amplitude'] = np.abs(np.diff(extremes(resampled['motor'], sides, starts, tolerance)[2]))
+            else:
+                strokes['motor_amplitude'] = np.nan
+            if 'following_error' in resampled:
+                fe = resampled['following_error']
+                squares = _segment_reduce(np.add, fe * fe, begin, end)
+                strokes['following_error_rms'] = np.sqrt(squares / (end - begin + 1))
+                strokes['following_error_max'] = _segment_reduce(np.maximum, np.abs(fe), begin, end)
+            else:
+                strokes['following_error_rms'] = np.nan
+                strokes['following_error_max'] = np.nan
+        self.strokes = strokes
+
+        self.frequencies, self.spectrum = flow_spectrum(velocity, rate, segment)
+        fe = resampled.get('following_error')
+        self.following_error_rms = float(np.sqrt(np.mean(fe * fe))) if fe is not None and len(fe) else math.nan
+        self.following_error_max = float(np.abs(fe).max()) if fe is not None and len(fe) else math.nan
+
+    def _line(self, center: float) -> Tuple[float, float]:
+        # Frequency (power-weighted) and amplitude of the line near bin center. A line between two bins
+        # spreads over the Hann main lobe, so its power is summed over LINE_BINS either side.
+        low = max(int(round(center)) - LINE_BINS, 1)
+        power = self.spectrum[low:int(round(center)) + LINE_BINS + 1] ** 2
+        if len(power) == 0 or power.sum() == 0:
+            return math.nan, 0.0
+        frequency = float((self.frequencies[low:low + len(power)] * power).sum() / power.sum())
+        return frequency, math.sqrt(float(power.sum()) / HANN_NOISE_BANDWIDTH)
+
+    def _fundamental(self) -> Tuple[float, float, float]:
+        # Frequency and amplitude of the strongest line, and the harmonic distortion above it
+        if len(self.spectrum) < 3:
+            return math.nan, math.nan, math.nan
+        frequency, fundamental = self._line(int(np.argmax(self.spectrum[1:])) + 1)
+        if not fundamental:
+            return frequency, fundamental, math.nan
+        step = self.frequencies[1]
+        harmonics = [self._line(k * frequency / step)[1] for k in range(2, HARMONICS + 1)
+                     if k * frequency / step < len(self.spectrum) - 1]
+        return frequency, fundamental, math.sqrt(sum(h * h for h in harmonics)) / fundamental
+
+    def summary(self) -> Dict[str, float]:
+        # One flat dict per run, so runs from a sweep can be compared side by side
+        strokes = self.strokes
+        frequency, flow_amplitude, distortion = self._fundamental()
+
+        def stat(values: np.ndarray, reduce) -> float:
+            values = values[~np.isnan(values)]
+            return float(reduce(values)) if len(values) else math.nan
+
+        def per_hour(field: str, direction: int) -> float:
+            mask = strokes['direction'] == direction
+            if mask.sum() < 2:
+                return math.nan
+            return float(np.polyfit(strokes['end'][mask], strokes[field][mask], 1)[0]) * 3600
+
+        final_drift = strokes['drift'][strokes['direction'] == -1]
+        return {
+            'duration_s': self.duration,
+            'samples': self.samples,
+            'rate_hz': float(self.rate),
+            'strokes': len(strokes),
+            'amplitude_mean': stat(strokes['amplitude'], np.mean),
+            'amplitude_std': stat(strokes['amplitude'], np.std),
+            'amplitude_min': stat(strokes['amplitude'], np.min),
+            'amplitude_max': stat(strokes['amplitude'], np.max),
+            'motor_amplitude_mean': stat(strokes['motor_amplitude'], np.mean),
+            'period_mean_s': stat(strokes['period'], np.mean),
+            'period_std_s': stat(strokes['period'], np.std),
+            'duration_mean_s': stat(strokes['duration'], np.mean),
+            'peak_velocity_max': stat(strokes['peak_velocity'], np.max),
+            'peak_acceleration_max': stat(strokes['peak_acceleration'], np.max),
+            'following_error_rms': self.following_error_rms,
+            'following_error_max': self.following_error_max,
+            'zero_drift_final': float(final_drift[-1]) if len(final_drift) else math.nan,
+            'zero_drift_per_hour': per_hour('drift', -1),
+            'top_drift_per_hour': per_hour('drift', 1),
+            'flow_frequency_hz': frequency,
+            'flow_amplitude': flow_amplitude,
+            'flow_harmonic_distortion': distortion,
+        }
+
+    def log(self) -> None:
+        summary = self.summary()
+        logging.info(f" Analyzed {summary['duration_s']:.1f} s at {summary['rate_hz']:.1f} Hz, "
+                     f"{summary['strokes']} strokes")
+        logging.info(f" Stroke amplitude: {summary['amplitude_mean']:.3f} Units mean, "
+                     f"{summary['amplitude_std']:.3f} std, {summary['amplitude_min']:.3f} - "
+                     f"{summary['amplitude_max']:.3f}")
+        logging.info(f" Period: {summary['period_mean_s']:.4f} s mean, {summary['period_std_s'] * 1000:.2f} ms std")
+        logging.info(f" Peak velocity {summary['peak_velocity_max']:.2f} Units/s, "
+                     f"peak acceleration {summary['peak_acceleration_max']:.2f} Units/s^2")
+        logging.info(f" Following error: {summary['following_error_rms']:.3f} Units RMS, "
+                     f"{summary['following_error_max']:.3f} Units max")
+        logging.info(f" Zero point drift: {summary['zero_drift_final']:.3f} Units final, "
+                     f"{summary['zero_drift_per_hour']:.3f} Units/hour")
+        logging.info(f" Flow: {summary['flow_frequency_hz']:.4f} Hz fundamental, {summary['flow_amplitude']:.3f} Units/s, "
+                     f"harmonic distortion {summary['flow_harmonic_distortion'] * 100:.1f}%")
+
+    def save_strokes(self, path: str) -> None:
+        np.savetxt(path, self.strokes, delimiter=',', header=','.join(STROKE_DTYPE.names), comments='',
+                   fmt=['%.6f', '%.6f', '%d'] + ['%.6f'] * (len(STROKE_DTYPE.names) - 3))
+
+
+def analyze_run_log(log: RunLog, **kwargs) -> RunAnalysis:
+    # Registers missing from the log are left out of the analysis.
+    arrays = log.arrays()
+    scale = log.scale_factor
+    series = {name: (arrays[name][0], arrays[name][1] * scale)
+              for name in ('motor_position', 'load_position', 'following_error')
+              if name in arrays and len(arrays[name][0])}
+    return RunAnalysis(series.get('motor_position'), series.get('load_position'), series.get('following_error'),
+                       **kwargs)
+
+
+def analyze_telemetry(rows: np.ndarray, scale_factor: float = 0.00625, **kwargs) -> RunAnalysis:
+    # Rows as returned by TelemetrySampler.snapshot(): time, motor, load, following error, ... in counts
+    times = rows[:, 0]
+    return RunAnalysis((times, rows[:, 1] * scale_factor), (times, rows[:, 2] * scale_factor),
+                       (times, rows[:, 3] * scale_factor), **kwargs)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Summarize the motion quality of a recorded run')
+    parser.add_argument('path', help='Run log file (runlog.py)')
+    parser.add_argument('-r', '--rate', type=float, help='Resampling rate (Hz, default: the recording rate)')
+    parser.add_argument('--smoothing', type=float, default=0.05, help='Smoothing before differentiating (s)')
+    parser.add_argument('--strokes', help='Write the per-stroke table to this CSV file')
+    parser.add_argument('--spectrum', help='Write the flow spectrum (Hz, Units/s) to this CSV file')
+    parser.add_argument('--json', action='store_true', help='Print the summary as one JSON line')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    analysis = analyze_run_log(RunLog(args.path), rate=args.rate, smoothing=args.smoothing)
+    elapsed = time.perf_counter() - started
+    if args.json:
+        print(json.dumps(dict(analysis.summary(), path=args.path)))
+    else:
+        analysis.log()
+        logging.info(f" Analysis took {elapsed:.2f} s")
+    if args.strokes:
+        analysis.save_strokes(args.strokes)
+    if args.spectrum:
+        np.savetxt(args.spectrum, np.column_stack((analysis.frequencies, analysis.spectrum)), delimiter=',',
+                   header='frequency_hz,amplitude', comments='', fmt='%.6f')
@@ -0,0 +1,308 @@
+import argparse
+import asyncio
+import collections
+import logging
+import time
+from typing import Deque, List, Optional
+
+import serial_asyncio
+
+from motor import DEFAULT_BAUD_RATE, CopMotor, CopMotorError, CopMotorPipelineError
+
+
+class _CopleyProtocol(asyncio.Protocol):
+    def __init__(self, motor: 'AsyncCopMotor') -> None:
+        self._motor = motor
+        self._buffer = b''
+
+    def data_received(self, data: bytes) -> None:
+        self._buffer += data
+        while b'\r' in self._buffer:
+            line, self._buffer = self._buffer.split(b'\r', 1)
+            self._motor._on_reply(line.decode().strip())
+
+    def connection_lost(self, exc) -> None:
+        self._motor._on_connection_lost(exc)
+
+
+class AsyncCopMotor:
+    # One request (or pipelined batch) on the wire at a time; callers queue on the lock in FIFO order.
+
+    def __init__(self, timeout: float = 15.0) -> None:
+        self._scale_factor = 0.00625
+        self._timeout = timeout
+        self._transport = None
+        self._protocol: Optional[_CopleyProtocol] = None
+        self._lock = asyncio.Lock()
+        self._pending: Deque[asyncio.Future] = collections.deque()  # one per reply still due, in order
+        self._stale = 0  # replies still owed to cancelled requests
+        self._stale_until = 0.0  # loop time after which an owed reply is taken as lost
+
+    @classmethod
+    async def connect(cls, port: str, timeout: float = 15.0, **kwargs) -> 'AsyncCopMotor':
+        motor = cls(timeout)
+        await motor.open(port, **kwargs)
+        return motor
+
+    async def open(self, port: str, **kwargs) -> None:
+        loop = asyncio.get_running_loop()
+        self._transport, self._protocol = await serial_asyncio.create_serial_connection(
+            loop, lambda: _CopleyProtocol(self), port, **kwargs)
+
+    def close(self) -> None:
+        if self._transport is not None:
+            self._transport.close()
+            self._transport = None
+
+    async def __aenter__(self) -> 'AsyncCopMotor':
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        # Runs on errors and cancellation alike. The shield keeps a second cancel from interrupting the
+        # disable, and the port is only closed once the drive has confirmed it.
+        task = asyncio.ensure_future(self.disable_drive())
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            while not task.done():
+                try:
+                    await asyncio.shield(task)
+                except asyncio.CancelledError:
+                    pass
+            raise
+        finally:
+            self.close()
+
+    def _log_str(self, data) -> str:
+        return data
+
+    def _on_reply(self, line: str) -> None:
+        logging.debug('read: %s', line)
+        if self._stale:
+            if asyncio.get_running_loop().time() < self._stale_until:
+                self._stale -= 1
+                return
+            self._stale = 0
+        if self._pending:
+            reply = self._pending.popleft()
+            if not reply.done():  # cancelled with its exchange: the reply is consumed here
+                reply.set_result(line)
+        else:
+            logging.error(f" Unsolicited response: {line}")
+
+    def _on_connection_lost(self, exc) -> None:
+        while self._pending:
+            reply = self._pending.popleft()
+            if not reply.done():
+                reply.set_exception(CopMotorError(f" Serial connection lost: {exc}"))
+
+    async def _exchange(self, commands: List[str], timeout: Optional[float] = None) -> List[str]:
+        # Write the whole batch, then collect one reply per command in order.
+        async with self._lock:
+            if self._transport is None:
+                raise CopMotorError(" Serial port is not open")
+            loop = asyncio.get_running_loop()
+            replies = [loop.create_future() for _ in commands]
+            self._pending = collections.deque(replies)
+            for command in commands:
+                logging.debug('write: %s', command)
+            self._transport.write(b''.join(command.encode() + b'\r' for command in commands))
+            timeout = self._timeout if timeout is None else timeout
+            try:
+                return [await asyncio.wait_for(reply, timeout) for reply in replies]
+            except asyncio.TimeoutError:
+                command = commands[len(commands) - len(self._pending)]
+                self._drain()
+                raise CopMotorError(f" Timed out waiting for response to: {command}")
+            except asyncio.CancelledError:
+                self._owe_replies()
+                raise
+            finally:
+                self._pending = collections.deque()
+
+    async def request(self, command: str, timeout: Optional[float] = None) -> str:
+        return (await self._exchange([command], timeout))[0]
+
+    def _owe_replies(self) -> None:
+        # The cancelled exchange's replies may still arrive; drop them instead of handing them to the next
+        # caller, but only for as long as a reply could take, so a reply that never comes is not owed forever.
+        if self._pending:
+            self._stale += len(self._pending)
+            self._stale_until = asyncio.get_running_loop().time() + self._timeout
+
+    def _drain(self) -> None:
+        # After a timeout the reply is taken as lost: discard anything half-received and start clean.
+        self._transport.serial.reset_input_buffer()
+        self._protocol._buffer = b''
+        self._stale = 0
+
+    async def set(self, data: str, timeout: Optional[float] = None) -> None:
+        response = await self.request('s ' + data, timeout)
+        if response != 'ok' and response != 'k':
+            raise CopMotorError(f" Failed to set command: {data}. Response: {response}")
+
+    async def get(self, data: str, timeout: Optional[float] = None) -> Optional[str]:
+        response = await self.request('g ' + data, timeout)
+        if response.startswith('v '):
+            return response.split(' ')[1]
+        logging.error(f" Unexpected response: {response}")
+        return None
+
+    async def pipeline(self, commands: List[str]) -> List[str]:
+        # Like CopMotor.pipeline: one write for the batch, replies matched to the commands in order.
+        responses = await self._exchange(commands)
+        results = []
+        for index, (command, response) in enumerate(zip(commands, responses)):
+            if command.startswith('g '):
+                if not response.startswith('v '):
+                    await self._pipeline_failed(commands, index, response)
+                results.append(response.split(' ')[1])
+            else:
+                if response != 'ok' and response != 'k':
+                    await self._pipeline_failed(commands, index, response)
+                results.append(response)
+        return results
+
+    async def _pipeline_failed(self, commands: List[str], index: int, response: str) -> None:
+        if 't 1' in commands[index + 1:]:
+            # A trajectory pipelined after the failed command has already started a move: stop it first.
+            await self.request('t 0')
+        raise CopMotorPipelineError(index, commands[index], response)
+
+    async def trajectory(self) -> None:
+        response = await self.request('t 1')
+        if response != 'ok':
+            raise CopMotorError(f" Failed command: t 1. Response: {response}")
+
+    async def set_mode_relative_move(self):
+        logging.info(self._log_str(" Set mode relative move"))
+        await self.set('r0xC8 256')
+
+    async def set_mode_programmed_position(self):
+        logging.info(self._log_str(" Set mode programmed position"))
+        await self.set('r0xC4 21')
+
+    async def set_relative_move(self, data, direction=1):
+        x = int(data / self._scale_factor)
+        x *= direction
+        await self.set(f"r0xCA {x}")
+
+    async def start_relative_move(self, data, direction=1):
+        await self.set_relative_move(data, direction)
+        await self.trajectory()
+
+    async def set_profile_velocity(self, data: float):
+        await self.set(f"r0xCB {int(data / self._scale_factor)}")
+
+    async def set_profile_acceleration(self, data: float):
+        await self.set(f"r0xCC {int(data / self._scale_factor)}")
+
+    async def set_profile_deceleration(self, data: float):
+        await self.set(f"r0xCD {int(data / self._scale_factor)}")
+
+    async def configure_profile(self, velocity: float, acceleration: float, deceleration: float):
+        logging.info(self._log_str(" Configure profile and programmed position mode"))
+        await self.set_profile_acceleration(acceleration)
+        await self.set_profile_deceleration(deceleration)
+        await self.set_profile_velocity(velocity)
+        await self.set_mode_relative_move()
+        await self.set_mode_programmed_position()
+
+    async def _get_scaled(self, register: str, name: str) -> Optional[float]:
+        try:
+            response = await self.get(register)
+        except CopMotorError as e:
+            logging.error(f" Error getting {name}: {e}")
+            return None
+        if response is None:
+            logging.error(f" Failed to get {name}.")
+            return None
+        data = float(response) * self._scale_factor
+        logging.info(self._log_str(f" {name.capitalize()}: {data: .5f}"))
+        return data
+
+    async def _get_int(self, register: str, name: str) -> Optional[int]:
+        try:
+            response = await self.get(register)
+        except CopMotorError as e:
+            logging.error(f" Error getting {name}: {e}")
+            return None
+        if response is None:
+            logging.error(f" Failed to get {name}.")
+            return None
+        data = int(response)
+        logging.info(self._log_str(f" {name.capitalize()}: {data}"))
+        return data
+
+    async def get_motor_position(self) -> Optional[float]:
+        return await self._get_scaled('r0x32', 'motor position')
+
+    async def get_load_position(self) -> Optional[float]:
+        return await self._get_scaled('r0x17', 'load position')
+
+    async def get_following_error(self) -> Optional[float]:
+        return await self._get_scaled('r0x35', 'following error')
+
+    async def get_event_register(self) -> Optional[int]:
+        return await self._get_int('r0xA0', 'event register')
+
+    async def get_trajectory_status(self) -> Optional[int]:
+        return await self._get_int('r0xC9', 'trajectory status register')
+
+    async def enable_drive(self) -> None:
+        logging.info(self._log_str(" Enable drive"))
+        await self.set("r0x24 21")
+        logging.info(" Motor enabled successfully.")
+
+    async def disable_drive(self) -> None:
+        logging.info(self._log_str(" Disabling drive."))
+        await self.set("r0x24 0")
+        await asyncio.sleep(1)
+
+
+def benchmark_sync(port: str, count: int, baud_rate: int = DEFAULT_BAUD_RATE) -> float:
+    dev = CopMotor(port, baud_rate=baud_rate)
+    start = time.perf_counter()
+    for _ in range(count):
+        dev.get('r0x32')
+    elapsed = time.perf_counter() - start
+    dev._dev.close()
+    return count / elapsed
+
+
+async def benchmark_async(port: str, count: int, baud_rate: int = DEFAULT_BAUD_RATE) -> float:
+    motor = await AsyncCopMotor.connect(port, baudrate=baud_rate)
+    start = time.perf_counter()
+    for _ in range(count):
+        await motor.get('r0x32')
+    elapsed = time.perf_counter() - start
+    motor.close()
+    return count / elapsed
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Compare sync and asyncio CopMotor command rates')
+    parser.add_argument('-p', '--port', help='Serial port (default: start a simulated drive)')
+    parser.add_argument('-n', '--count', type=int, default=200, help='Commands per transport')
+    parser.add_argument('-b', '--baud-rate', type=int, default=9600, help='Simulated drive baud rate')
+    args = parser.parse_args()
+
+    sim = None
+    port = args.port
+    baud_rate = DEFAULT_BAUD_RATE  # a real drive powers up at 9600
+    if port is None:
+        from simulator import CopleySimulator
+        sim = CopleySimulator(baud_rate=args.baud_rate)
+        sim.start()
+        port = sim.port
+        baud_rate = sim.baud_rate
+    try:
+        sync_rate = benchmark_sync(port, args.count, baud_rate)
+        async_rate = asyncio.run(benchmark_async(port, args.count, baud_rate))
+        print(f" CopMotor: {sync_rate:.1f} commands/s")
+        print(f" AsyncCopMotor: {async_rate:.1f} commands/s")
+    finally:
+        if sim is not None:
+            sim.close()
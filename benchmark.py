@@ -0,0 +1,209 @@
+import argparse
+import json
+import logging
+import platform
+import sys
+import time
+from typing import Dict
+
+from motor import CopMotor
+from oscillation import OscillationEngine, StrokeSchedule
+from runlog import RECORD_DTYPE
+from safety import measure_abort_latency
+from simulator import CopleySimulator
+from telemetry import COLUMNS, TELEMETRY_REGISTERS, TelemetrySampler
+
+# True when a larger value is better
+METRICS = {
+    'set_per_s': True,
+    'cached_set_per_s': True,
+    'get_per_s': True,
+    'configuration_s': False,
+    'strokes_per_s': True,
+    'stroke_period_jitter_ms': False,
+    'phase_drift_ms': False,
+    'stroke_cache_hits_per_stroke': True,
+    'stroke_cache_misses_per_stroke': False,
+    'telemetry_samples_per_s': True,
+    'runlog_mb_per_hour': False,
+    'ring_buffer_mb_per_hour': False,
+    'abort_latency_ms': False,
+    'ascii_bytes_per_command': False,
+    'binary_bytes_per_command': False,
+    'ascii_round_trips_per_sample': False,
+    'binary_round_trips_per_sample': False,
+    'ascii_get_per_s': True,
+    'binary_get_per_s': True,
+}
+# Differences smaller than this are scheduler noise, whatever the relative change
+NOISE_FLOOR = {
+    'stroke_period_jitter_ms': 1.0,
+    'phase_drift_ms': 1.0,
+    'abort_latency_ms': 5.0,
+}
+
+
+def bench_commands(dev: CopMotor, count: int) -> Dict[str, float]:
+    # Repeated writes of the same value are dropped by the register cache, so it is cleared before
+    # every timed write. cached_set_per_s times the hit path alone; the stroke loop never takes it
+    # (see stroke_cache_hits_per_stroke).
+    start = time.perf_counter()
+    for _ in range(count):
+        dev.invalidate_cache()
+        dev.set('r0xCA 100')
+    set_rate = count / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(count):
+        dev.set('r0xCA 100')
+    cached_set_rate = count / (time.perf_counter() - start)
+    start = time.perf_counter()
+    for _ in range(count):
+        dev.get('r0x32')
+    get_rate = count / (time.perf_counter() - start)
+    return {'set_per_s': set_rate, 'cached_set_per_s': cached_set_rate, 'get_per_s': get_rate}
+
+
+def bench_configuration(dev: CopMotor, repeats: int = 5) -> Dict[str, float]:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        dev.invalidate_cache()
+        dev.configure_profile(300, 10, 10)
+        dev.enable_drive()
+    return {'configuration_s': (time.perf_counter() - start) / repeats}
+
+
+def bench_oscillation(dev: CopMotor, duration: float) -> Dict[str, float]:
+    # Short, fast strokes so the command path rather than the motion dominates.
+    dev.configure_profile(800, 100, 100)
+    dev.enable_drive()
+    schedule = StrokeSchedule(2, 800, 100, 100, duration)
+    start = time.perf_counter()
+    report = OscillationEngine(dev, schedule).run()
+    elapsed = time.perf_counter() - start
+    return {
+        'strokes_per_s': report.strokes / elapsed,
+        'stroke_period_jitter_ms': report.period_jitter * 1000,
+        'phase_drift_ms': report.max_drift * 1000,
+        'stroke_cache_hits_per_stroke': report.cache_hits / report.strokes if report.strokes else 0.0,
+        'stroke_cache_misses_per_stroke': report.cache_misses / report.strokes if report.strokes else 0.0,
+    }
+
+
+def bench_telemetry(dev: CopMotor, duration: float) -> Dict[str, float]:
+    sampler = TelemetrySampler(dev, rate=1000.0, capacity=10000)
+    sampler.start()
+    time.sleep(duration)
+    sampler.stop()
+    rate = sampler.achieved_rate
+    runlog_bytes = rate * len(TELEMETRY_REGISTERS) * RECORD_DTYPE.itemsize * 3600
+    # An hour of capacity, with the default headroom of another hour, each row stored twice
+    ring_bytes = rate * 4 * len(COLUMNS) * 8 * 3600
+    return {
+        'telemetry_samples_per_s': rate,
+        'runlog_mb_per_hour': runlog_bytes / 1e6,
+        'ring_buffer_mb_per_hour': ring_bytes / 1e6,
+    }
+
+
+def bench_protocol(port: str, baud_rate: int, protocol: str, count: int) -> Dict[str, float]:
+    # Link cost of the same traffic in each protocol: bytes on the wire per command (both
+    # directions) and request/reply exchanges per telemetry sample.
+    dev = CopMotor(port, protocol=protocol, baud_rate=baud_rate)
+    stats = dev.instrument()
+    commands = ['g r0x32', 's r0xCA 100', 'g r0xA0', 't 1']
+    for _ in range(count // len(commands)):
+        for command in commands:
+            dev.invalidate_cache()
+            dev.pipeline([command])
+    snapshot = stats.snapshot(reset=True)
+    sent = sum(entry['count'] for entry in snapshot['commands'].values())
+    results = {f'{protocol}_bytes_per_command': (snapshot['bytes_written'] + snapshot['bytes_read']) / sent}
+
+    start = time.perf_counter()
+    for _ in range(count):
+        dev.get('r0x32')
+    results[f'{protocol}_get_per_s'] = count / (time.perf_counter() - start)
+    stats.reset()
+
+    sampler = TelemetrySampler(dev, rate=50.0, capacity=1000)
+    sampler.start()
+    time.sleep(1.0)
+    sampler.stop()
+    results[f'{protocol}_round_trips_per_sample'] = stats.snapshot()['exchanges'] / max(sampler.buffer.total, 1)
+    dev._dev.close()
+    return results
+
+
+def bench_abort(baud_rate: int, trials: int = 5) -> Dict[str, float]:
+    # Worst case over several aborts with the control loop stuck in a read
+    return {'abort_latency_ms': max(measure_abort_latency(baud_rate, trials)) * 1000}
+
+
+def run(baud_rate: int, reply_delay: float, count: int, duration: float) -> Dict[str, object]:
+    with CopleySimulator(baud_rate=baud_rate, reply_delay=reply_delay) as sim:
+        dev = CopMotor(sim.port, baud_rate=sim.baud_rate)  # the simulator ignores commands sent at any other rate
+        results = {}
+        results.update(bench_commands(dev, count))
+        results.update(bench_configuration(dev))
+        results.update(bench_oscillation(dev, duration))
+        results.update(bench_telemetry(dev, duration))
+        dev._dev.close()
+        for protocol in ('ascii', 'binary'):
+            results.update(bench_protocol(sim.port, sim.baud_rate, protocol, count))
+    results.update(bench_abort(baud_rate))
+    return {
+        'environment': {
+            'baud_rate': baud_rate,
+            'reply_delay_s': reply_delay,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': results,
+    }
+
+
+def compare(current: Dict[str, float], baseline: Dict[str, float], tolerance: float) -> Dict[str, Dict[str, object]]:
+    comparison = {}
+    for name, higher_is_better in METRICS.items():
+        if name not in current or name not in baseline or not baseline[name]:
+            continue
+        change = (current[name] - baseline[name]) / abs(baseline[name])
+        regressed = change < -tolerance if higher_is_better else change > tolerance
+        if abs(current[name] - baseline[name]) < NOISE_FLOOR.get(name, 0.0):
+            regressed = False
+        comparison[name] = {
+            'baseline': baseline[name],
+            'current': current[name],
+            'change': change,
+            'regressed': regressed,
+        }
+    return comparison
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    parser = argparse.ArgumentParser(description='Benchmark the CopMotor command path against a simulated drive')
+    parser.add_argument('-b', '--baud-rate', type=int, default=9600, help='Simulated drive baud rate')
+    parser.add_argument('-r', '--reply-delay', type=float, default=0.0005, help='Simulated drive reply delay (s)')
+    parser.add_argument('-n', '--count', type=int, default=200, help='Commands per set/get measurement')
+    parser.add_argument('-t', '--duration', type=float, default=5.0, help='Seconds per oscillation/telemetry run')
+    parser.add_argument('-o', '--output', help='Write results JSON to this file')
+    parser.add_argument('--baseline', help='Compare against a saved results JSON')
+    parser.add_argument('--tolerance', type=float, default=0.1, help='Allowed relative regression (default 0.1)')
+    args = parser.parse_args()
+
+    output = run(args.baud_rate, args.reply_delay, args.count, args.duration)
+    regressed = False
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        output['comparison'] = compare(output['results'], baseline['results'], args.tolerance)
+        regressed = any(entry['regressed'] for entry in output['comparison'].values())
+
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+    sys.exit(1 if regressed else 0)
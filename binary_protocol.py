@@ -0,0 +1,147 @@
+import collections
+import struct
+from functools import reduce
+from typing import Dict, Optional, Tuple
+
+# Copley binary serial frame: node ID, checksum, data size in 16-bit words, opcode (error code in
+# replies), then the data words, most significant first. The XOR of every byte is CHECKSUM.
+CHECKSUM = 0x5A
+HEADER = struct.Struct('>BBBB')
+OP_GET_VARIABLE = 0x0C
+OP_SET_VARIABLE = 0x0D
+OP_TRAJECTORY = 0x11
+
+# Register width in words and signedness; anything not listed is a signed 32-bit value.
+REGISTER_FORMATS: Dict[int, Tuple[int, bool]] = {
+    0x17: (2, True),    # load position
+    0x24: (1, True),    # desired state
+    0x32: (2, True),    # motor position
+    0x35: (2, True),    # following error
+    0x81: (2, False),   # drive serial number
+    0x90: (2, False),   # baud rate
+    0xA0: (2, False),   # event status register
+    0xC4: (1, False),
+    0xC8: (1, False),   # profile type
+    0xC9: (1, False),   # trajectory status
+    0xCA: (2, True),    # move distance / target position
+    0xCB: (2, False),   # profile velocity
+    0xCC: (2, False),   # profile acceleration
+    0xCD: (2, False),   # profile deceleration
+}
+STRING_REGISTERS = (0x80,)  # drive model number
+
+
+def checksum(data: bytes) -> int:
+    # 0 for an intact frame; over a frame with a zero checksum byte, the byte that makes it intact
+    return reduce(lambda a, b: a ^ b, data, CHECKSUM)
+
+
+def frame(opcode: int, data: bytes = b'', node: int = 0) -> bytes:
+    # The checksum byte is chosen so the XOR of the whole frame comes out to CHECKSUM.
+    header = bytes((node, 0, len(data) // 2, opcode))
+    return bytes((node, checksum(header + data), len(data) // 2, opcode)) + data
+
+
+def frame_length(buffer: bytes) -> Optional[int]:
+    # Total length of the frame at the start of buffer, once its header has arrived.
+    if len(buffer) < HEADER.size:
+        return None
+    return HEADER.size + 2 * buffer[2]
+
+
+def encode_value(register: int, value: int) -> bytes:
+    words, signed = REGISTER_FORMATS.get(register, (2, True))
+    return value.to_bytes(2 * words, 'big', signed=signed)
+
+
+def decode_value(register: int, data: bytes) -> str:
+    if register in STRING_REGISTERS:
+        return data.rstrip(b'\0').decode(errors='replace')
+    signed = REGISTER_FORMATS.get(register, (2, True))[1]
+    return str(int.from_bytes(data, 'big', signed=signed))
+
+
+def encode_command(command: str) -> Tuple[bytes, Optional[int]]:
+    # ASCII command text -> binary frame, plus the register whose value the reply carries
+    parts = command.split()
+    if parts[0] == 'g':
+        register = int(parts[1][1:], 0)
+        return frame(OP_GET_VARIABLE, register.to_bytes(2, 'big')), register
+    if parts[0] == 's':
+        register = int(parts[1][1:], 0)
+        return frame(OP_SET_VARIABLE, register.to_bytes(2, 'big') + encode_value(register, int(parts[2], 0))), None
+    if parts[0] == 't':
+        return frame(OP_TRAJECTORY, int(parts[1], 0).to_bytes(2, 'big')), None
+    raise ValueError(f" No binary encoding for command: {command}")
+
+
+def decode_command(data: bytes) -> str:
+    # Binary frame -> the equivalent ASCII command text
+    _, _, _, opcode = HEADER.unpack_from(data)
+    body = data[HEADER.size:]
+    if opcode == OP_GET_VARIABLE:
+        return f'g r0x{int.from_bytes(body[:2], "big") & 0x0FFF:X}'
+    if opcode == OP_SET_VARIABLE:
+        register = int.from_bytes(body[:2], 'big') & 0x0FFF
+        signed = REGISTER_FORMATS.get(register, (2, True))[1]
+        return f's r0x{register:X} {int.from_bytes(body[2:], "big", signed=signed)}'
+    if opcode == OP_TRAJECTORY:
+        return f't {int.from_bytes(body[:2], "big")}'
+    raise ValueError(f" Unknown opcode: {opcode:#x}")
+
+
+def encode_reply(command: str, reply: str) -> bytes:
+    # ASCII reply text -> binary reply frame for the given command
+    parts = reply.split(None, 1)
+    if parts[0] == 'e':
+        return frame(int(parts[1]))
+    if parts[0] == 'v':
+        register = int(command.split()[1][1:], 0)
+        if register in STRING_REGISTERS:
+            text = parts[1].encode()
+            return frame(0, text + b'\0' * (len(text) % 2))
+        return frame(0, encode_value(register, int(parts[1])))
+    return frame(0)
+
+
+class BinaryProtocol:
+    # Same replies as the ASCII protocol ('ok', 'v N', 'e N'), so CopMotor's methods do not change.
+    # Replies carry no register number, so the register of each outstanding get is queued in order.
+
+    name = 'binary'
+
+    def __init__(self) -> None:
+        self._frames: Dict[str, Tuple[bytes, Optional[int]]] = {}
+        self._pending = collections.deque()
+
+    def encode(self, command: str) -> bytes:
+        encoded = self._frames.get(command)
+        if encoded is None:
+            encoded = encode_command(command)
+            if command[0] != 's':
+                # Gets and trajectory commands repeat verbatim; sets carry changing values.
+                self._frames[command] = encoded
+        data, register = encoded
+        self._pending.append(register)
+        return data
+
+    def read_reply(self, dev) -> Tuple[str, int]:
+        register = self._pending.popleft() if self._pending else None
+        header = dev.read(HEADER.size)
+        if len(header) < HEADER.size:
+            return '', len(header)
+        _, _, size, error = HEADER.unpack(header)
+        data = dev.read(2 * size) if size else b''
+        received = len(header) + len(data)
+        if len(data) < 2 * size:
+            return '', received
+        if checksum(header + data) != 0:
+            return 'e checksum', received
+        if error:
+            return f'e {error}', received
+        if register is None or not data:
+            return 'ok', received
+        return f'v {decode_value(register, data)}', received
+
+    def reset(self) -> None:
+        self._pending.clear()
@@ -0,0 +1,242 @@
+import argparse
+import collections
+import struct
+import threading
+import time
+from typing import Deque, List, Optional, Tuple
+
+from motor import CopMotor, CopMotorError
+
+MAGIC = b'COPCAP\x00\x00'
+VERSION = 1
+# magic, version, wall clock at capture start, protocol name, baud rate at capture start
+HEADER = struct.Struct('<8sH6xd8sI')
+HEADER_SIZE = 64
+# seconds since capture start, kind, payload length; the payload bytes follow
+RECORD = struct.Struct('<dBH')
+WRITE = 0
+READ = 1
+
+
+class CaptureError(CopMotorError):
+    pass
+
+
+class CaptureSerial:
+    # Wraps a serial.Serial and appends every write and read to a capture file, timestamped with
+    # perf_counter. Everything else (timeout, baudrate, cancel_read, ...) goes to the real port.
+
+    def __init__(self, dev, path: str, protocol: str = 'ascii', flush_bytes: int = 1 << 16) -> None:
+        object.__setattr__(self, '_dev', dev)
+        object.__setattr__(self, '_lock', threading.Lock())
+        object.__setattr__(self, '_buffer', bytearray())
+        object.__setattr__(self, '_flush_bytes', flush_bytes)
+        object.__setattr__(self, '_file', open(path, 'wb'))
+        object.__setattr__(self, '_started', time.perf_counter())
+        header = HEADER.pack(MAGIC, VERSION, time.time(), protocol.encode()[:8], dev.baudrate or 0)
+        self._file.write(header.ljust(HEADER_SIZE, b'\0'))
+
+    def __getattr__(self, name):
+        return getattr(self._dev, name)
+
+    def __setattr__(self, name, value) -> None:
+        setattr(self._dev, name, value)
+
+    def _record(self, kind: int, data: bytes) -> None:
+        with self._lock:
+            self._buffer += RECORD.pack(time.perf_counter() - self._started, kind, len(data)) + data
+            if len(self._buffer) >= self._flush_bytes:
+                self._file.write(self._buffer)
+                self._buffer.clear()
+
+    def write(self, data: bytes) -> int:
+        # Timestamped before the write, so the time to the first reply is the whole round trip
+        self._record(WRITE, bytes(data))
+        return self._dev.write(data)
+
+    def read(self, size: int = 1) -> bytes:
+        data = self._dev.read(size)
+        self._record(READ, data)
+        return data
+
+    def read_until(self, expected: bytes = b'\n', size: Optional[int] = None) -> bytes:
+        data = self._dev.read_until(expected, size)
+        self._record(READ, data)
+        return data
+
+    def flush(self) -> None:
+        self._dev.flush()
+        with self._lock:
+            self._file.write(self._buffer)
+            self._buffer.clear()
+            self._file.flush()
+
+    def close(self) -> None:
+        self._dev.close()
+        with self._lock:
+            if not self._file.closed:
+                self._file.write(self._buffer)
+                self._buffer.clear()
+                self._file.close()
+
+
+class Exchange:
+    def __init__(self, time: float, written: bytes) -> None:
+        self.time = time
+        self.written = written
+        self.reads: List[Tuple[float, bytes]] = []
+
+
+def load_capture(path: str) -> Tuple[Tuple[float, str, int], List[Exchange]]:
+    # Header (start time, protocol, baud rate) and the session grouped into exchanges:
+    # one write and the reads that followed it.
+    with open(path, 'rb') as f:
+        data = f.read()
+    if len(data) < HEADER_SIZE:
+        raise CaptureError(f" {path} is too short to be a capture")
+    magic, version, started, protocol, baud_rate = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise CaptureError(f" {path} is not a version {VERSION} capture")
+    exchanges = []
+    offset = HEADER_SIZE
+    while offset + RECORD.size <= len(data):
+        timestamp, kind, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        payload = data[offset:offset + length]
+        offset += length
+        if kind == WRITE:
+            exchanges.append(Exchange(timestamp, payload))
+        elif exchanges:
+            exchanges[-1].reads.append((timestamp, payload))
+    return (started, protocol.rstrip(b'\0').decode(), baud_rate), exchanges
+
+
+class ReplaySerial:
+    # Serial stand-in that answers each write with the reads recorded after the same bytes.
+    # Writes are matched against the next few unused exchanges rather than strictly in order,
+    # so traffic from other threads (watchdog, telemetry) that interleaved differently in the
+    # capture does not derail the replay. With realtime, each reply arrives as long after its
+    # write as it did on the rig; otherwise immediately.
+
+    def __init__(self, path: str, realtime: bool = True, lookahead: int = 64) -> None:
+        (self.started, self.protocol, self.baudrate), self._exchanges = load_capture(path)
+        self.realtime = realtime
+        self.lookahead = lookahead
+        self.port = path
+        self.timeout = None
+        self.write_timeout = None
+        self.is_open = True
+        self._next = 0
+        self._last = 0
+        self._used = set()
+        self._replies: Deque[Tuple[float, bytes]] = collections.deque()
+        self._offset = 0.0
+        self.skipped = 0
+
+    @property
+    def remaining(self) -> int:
+        return len(self._exchanges) - len(self._used)
+
+    def open(self) -> None:
+        self.is_open = True
+
+    def close(self) -> None:
+        self.is_open = False
+
+    def write(self, data: bytes) -> int:
+        data = bytes(data)
+        end = min(max(self._next, self._last) + self.lookahead, len(self._exchanges))
+        for index in range(self._next, end):
+            if index not in self._used and self._exchanges[index].written == data:
+                break
+        else:
+            raise CaptureError(f" Write {data!r} does not match the capture after exchange {self._next}")
+        exchange = self._exchanges[index]
+        self._used.add(index)
+        self._last = max(self._last, index)
+        # Exchanges left unused a whole lookahead behind the latest match are traffic this run
+        # does not make (the watchdog's reads during a replay): skip them so they do not pin the window.
+        while self._next in self._used or self._last - self._next >= self.lookahead:
+            if self._next not in self._used:
+                self.skipped += 1
+            self._next += 1
+        self._offset = time.perf_counter() - exchange.time
+        self._replies.extend(exchange.reads)
+        return len(data)
+
+    def _reply(self) -> bytes:
+        if not self._replies:
+            return b''
+        timestamp, data = self._replies.popleft()
+        if self.realtime:
+            delay = timestamp + self._offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        return data
+
+    def read(self, size: int = 1) -> bytes:
+        return self._reply()
+
+    def read_until(self, expected: bytes = b'\n', size: Optional[int] = None) -> bytes:
+        return self._reply()
+
+    def flush(self) -> None:
+        pass
+
+    def reset_input_buffer(self) -> None:
+        self._replies.clear()
+
+    def cancel_read(self) -> None:
+        pass
+
+    def send_break(self, duration: float = 0.25) -> None:
+        pass
+
+
+def split_commands(written: bytes, protocol: str) -> List[str]:
+    # The command text of every command in one recorded write
+    if protocol == 'binary':
+        import binary_protocol
+        commands = []
+        while written:
+            length = binary_protocol.frame_length(written)
+            commands.append(binary_protocol.decode_command(written[:length]))
+            written = written[length:]
+        return commands
+    return [command.decode(errors='replace').strip() for command in written.split(b'\r') if command.strip()]
+
+
+def measure_overhead(path: str) -> Tuple[int, float]:
+    # Replays every exchange through CopMotor's command path with no link delay, so the time
+    # per command is host-side cost only: encoding, the port calls, decoding and bookkeeping.
+    _, exchanges = load_capture(path)
+    dev = CopMotor.replay(path, realtime=False)
+    protocol = dev._dev.protocol
+    batches = [split_commands(exchange.written, protocol) for exchange in exchanges]
+    start = time.perf_counter()
+    for commands in batches:
+        dev._exchange(commands)
+    elapsed = time.perf_counter() - start
+    return sum(len(commands) for commands in batches), elapsed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarize a CopMotor serial capture and measure host-side overhead')
+    parser.add_argument('capture', help='Capture file written with --capture')
+    args = parser.parse_args()
+
+    (started, protocol, baud_rate), exchanges = load_capture(args.capture)
+    written = sum(len(exchange.written) for exchange in exchanges)
+    read = sum(len(data) for exchange in exchanges for _, data in exchange.reads)
+    timeouts = sum(1 for exchange in exchanges for _, data in exchange.reads if not data)
+    round_trips = sorted(exchange.reads[-1][0] - exchange.time for exchange in exchanges if exchange.reads)
+    duration = exchanges[-1].time if exchanges else 0.0
+    print(f" Captured {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started))}, {protocol} at {baud_rate} baud")
+    print(f" {len(exchanges)} exchanges in {duration:.2f} s, {written} bytes written, {read} bytes read, "
+          f"{timeouts} empty reads")
+    if round_trips:
+        print(f" Exchange time on the rig: p50 {round_trips[len(round_trips) // 2] * 1000:.2f} ms, "
+              f"max {round_trips[-1] * 1000:.2f} ms")
+    commands, elapsed = measure_overhead(args.capture)
+    if commands:
+        print(f" Host-side overhead: {elapsed / commands * 1e6:.1f} us per command ({commands} commands replayed)")
@@ -0,0 +1,183 @@
+import logging
+import math
+import time
+from typing import List, Optional, Tuple
+
+from motor import (MAX_VELOCITY_UNITS_SCALED, SET_ACCELERATION_UNITS_FIXED, SET_DECELERATION_UNITS_FIXED,
+                   move_duration)
+
+
+class CorrectionReport:
+    def __init__(self, corrector: 'StrokeCorrector') -> None:
+        scale = corrector._scale
+        delta = corrector._delta
+        ends = corrector.load_ends
+        previous = [corrector._load_origin] + ends[:-1]
+        amplitudes = [abs(end - start) * scale for start, end in zip(previous, ends)]
+        bottoms = [(end - corrector._load_origin) * scale for end, direction in zip(ends, corrector.directions)
+                   if direction < 0]
+        self.strokes = len(ends)
+        self.target_amplitude = delta * scale
+        self.mean_amplitude = sum(amplitudes) / len(amplitudes) if amplitudes else float('nan')
+        self.worst_amplitude_error = max((abs(a - self.target_amplitude) for a in amplitudes), default=0.0)
+        self.final_zero_drift = bottoms[-1] if bottoms else 0.0
+        self.max_zero_drift = max((abs(b) for b in bottoms), default=0.0)
+        self.trim = {direction: trim * scale for direction, trim in corrector._trim.items()}
+        self.profile_scale = corrector.profile_scale
+        self.max_profile_scale = corrector.max_profile_scale
+        self.clamped = corrector.clamped
+
+    def log(self) -> None:
+        logging.info(f" Stroke amplitude: {self.mean_amplitude:.3f} Units mean, target {self.target_amplitude:.3f}, "
+                     f"worst error {self.worst_amplitude_error:.3f} Units over {self.strokes} strokes")
+        logging.info(f" Zero point drift: {self.final_zero_drift:.3f} Units final, {self.max_zero_drift:.3f} Units max")
+        logging.info(f" Stroke trim: {self.trim[1]:+.3f} Units up, {self.trim[-1]:+.3f} Units down, "
+                     f"{self.clamped} corrections at their limit")
+        logging.info(f" Profile scale: {self.profile_scale:.3f} final, {self.max_profile_scale:.3f} max")
+
+
+class StrokeCorrector:
+    # Closes the loop around the open-loop relative moves, one stroke at a time:
+    # - Each stroke is aimed at the absolute motor position of its end of the envelope, so zero point
+    #   drift does not accumulate, plus a per-direction trim learned from where the load stopped.
+    # - The profile (velocity, acceleration and deceleration together) is scaled so a lengthened stroke
+    #   still takes the planned stroke time, and a little further whenever a move finishes less than
+    #   min_slack before the next stroke is due; it eases back once there is slack again. The total
+    #   profile scale never exceeds 1 + max_trim.
+    # Adjustments are bounded per stroke by max_step and in total by max_trim (fractions of DELTA or
+    # of the profile). Any profile change is written after the move has finished, in the guard time
+    # before the next stroke, and the load position is read once per stroke, pipelined just ahead of
+    # the next stroke's start; the motor position is tracked from the commanded distances. Following
+    # error is not an input: the safety watchdog trips on it.
+
+    def __init__(self, dev, origin: float, delta: float, velocity: float, acceleration: float,
+                 deceleration: float, gain: float = 0.5, max_step: float = 0.01, max_trim: float = 0.05,
+                 min_slack: float = 0.02) -> None:
+        self._dev = dev
+        self._scale = dev._scale_factor
+        self._origin = round(origin / self._scale)  # counts
+        self._delta = round(delta / self._scale)
+        self._velocity = int(velocity / self._scale)
+        self._acceleration = int(acceleration / self._scale)
+        self._deceleration = int(deceleration / self._scale)
+        self._max_velocity = int(MAX_VELOCITY_UNITS_SCALED / self._scale)
+        self._max_acceleration = int(SET_ACCELERATION_UNITS_FIXED / self._scale)
+        self._max_deceleration = int(SET_DECELERATION_UNITS_FIXED / self._scale)
+        self._stroke_time = move_duration(self._delta, self._velocity, self._acceleration, self._deceleration)
+        self.gain = gain
+        self.max_step = max_step
+        self.max_trim = max_trim
+        self.min_slack = min_slack
+
+        self._trim = {1: 0.0, -1: 0.0}  # counts added to each direction's stroke
+        self._pace_scale = 1.0  # on top of the profile scale that keeps the planned stroke time
+        self._position: Optional[int] = None  # motor position expected at the start of the next stroke
+        self._load_origin: Optional[int] = None
+        self._direction: Optional[int] = None  # direction of the stroke in flight
+        self._planned: Optional[Tuple[int, int]] = None  # (direction, distance) of the next stroke
+
+        self.load_ends: List[int] = []
+        self.directions: List[int] = []
+        self.distances: List[int] = []
+        self.clamped = 0
+        self.profile_scale = 1.0
+        self.max_profile_scale = 1.0
+
+    @staticmethod
+    def _clamp(value: float, low: float, high: float):
+        return min(max(value, low), high)
+
+    def _begin(self) -> None:
+        motor, load = self._dev.pipeline(['g r0x32', 'g r0x17'])
+        self._position = int(motor)
+        self._load_origin = int(load)
+
+    def settled(self) -> None:
+        # The stroke in flight has finished: learn its direction's trim from where the load stopped.
+        if self._direction is not None:
+            self._learn(int(self._dev.get('r0x17')))
+
+    def _learn(self, load: int) -> None:
+        direction = self._direction
+        target = self._load_origin + (self._delta if direction > 0 else 0)
+        step = self.gain * (target - load) * direction
+        limit = self.max_step * self._delta
+        trim = self._trim[direction] + self._clamp(step, -limit, limit)
+        if abs(step) > limit or abs(trim) > self.max_trim * self._delta:
+            self.clamped += 1
+        self._trim[direction] = self._clamp(trim, -self.max_trim * self._delta, self.max_trim * self._delta)
+        self.load_ends.append(load)
+        self.directions.append(direction)
+        self._direction = None
+
+    def _profile(self, scale: float) -> Tuple[int, int, int]:
+        return (min(int(self._velocity * scale), self._max_velocity),
+                min(int(self._acceleration * scale), self._max_acceleration),
+                min(int(self._deceleration * scale), self._max_deceleration))
+
+    def _pace(self, distance: int, slack: Optional[float]) -> Tuple[int, int, int]:
+        # Profile velocity, acceleration and deceleration register values for a stroke of distance counts
+        if slack is not None:
+            if slack < self.min_slack:
+                self._pace_scale = min(self._pace_scale * (1 + self.max_step), 1 + self.max_trim)
+            elif slack > 2 * self.min_slack:
+                self._pace_scale = max(self._pace_scale / (1 + self.max_step), 1.0)
+        # Smallest profile scale that covers the distance in the planned stroke time. Scaling the whole
+        # profile shortens both cruise-limited and acceleration-limited moves; move time falls
+        # monotonically with the scale, so bisect between the requested profile and the cap.
+        low, high = 1.0, 1 + self.max_trim
+        if move_duration(distance, *self._profile(low)) > self._stroke_time:
+            for _ in range(16):
+                middle = (low + high) / 2
+                if move_duration(distance, *self._profile(middle)) > self._stroke_time:
+                    low = middle
+                else:
+                    high = middle
+            low = high
+        # Rounded up to whole steps so the profile registers are only rewritten when the scale moves
+        # by a step; in between the register cache drops the writes.
+        scale = math.ceil(low * self._pace_scale / self.max_step - 1e-9) * self.max_step
+        scale = min(scale, 1 + self.max_trim)
+        self.max_profile_scale = max(self.max_profile_scale, scale)
+        self.profile_scale = scale
+        return self._profile(scale)
+
+    def prepare(self, direction: int, deadline: Optional[float] = None) -> None:
+        # Between strokes: plan the next one and write any profile change now, in the guard time, so
+        # only its distance and trajectory start go out at its start time. deadline is that start
+        # time; without one the pace is not adjusted.
+        if self._position is None:
+            self._begin()
+        finished = self._direction is not None
+        slack = deadline - time.monotonic() if finished and deadline is not None else None
+        target = self._origin + (self._delta if direction > 0 else 0)
+        distance = (target - self._position) * direction + self._trim[direction]
+        low, high = (1 - self.max_trim) * self._delta, (1 + self.max_trim) * self._delta
+        if not low <= distance <= high:
+            self.clamped += 1
+        distance = int(round(self._clamp(distance, low, high)))
+        velocity, acceleration, deceleration = self._pace(distance, slack)
+        # The register cache drops the writes that did not change since the last stroke.
+        self._dev.pipeline([f's r0xCB {velocity}', f's r0xCC {acceleration}', f's r0xCD {deceleration}'])
+        self._planned = (direction, distance)
+
+    def stroke(self, direction: int) -> None:
+        # Start the stroke planned by prepare()
+        if self._planned is None or self._planned[0] != direction:
+            self.prepare(direction)
+        distance = self._planned[1]
+        self._planned = None
+        commands = [f's r0xCA {distance * direction}', 't 1']
+        if self._direction is not None:
+            # The previous stroke has finished. Its load position is read in the same batch, just
+            # before this stroke starts moving it; it is only needed for the next stroke in its direction.
+            commands.insert(0, 'g r0x17')
+        replies = self._dev.pipeline(commands)
+        if self._direction is not None:
+            self._learn(int(replies[0]))
+        self._position += distance * direction
+        self._direction = direction
+        self.distances.append(distance)
+
+    def report(self) -> CorrectionReport:
+        return CorrectionReport(self)
@@ -0,0 +1,161 @@
+import argparse
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import serial
+import serial.tools.list_ports
+
+from motor import BAUD_RATES, DEFAULT_BAUD_RATE, CopMotorError
+
+# The drive powers up at 9600 baud; the other rates only matter if a run left it upgraded.
+PROBE_BAUD_RATES = (DEFAULT_BAUD_RATE,) + tuple(rate for rate in BAUD_RATES if rate != DEFAULT_BAUD_RATE)
+# Drive model number (0x80) and serial number (0x81)
+IDENTIFY = b'g r0x80\rg r0x81\r'
+DEFAULT_CACHE = os.path.join(os.path.expanduser('~'), '.copley_drives.json')
+
+
+class DiscoveryError(CopMotorError):
+    pass
+
+
+class DriveInfo:
+    def __init__(self, port: str, baud_rate: int, model: str, serial_number: int,
+                 usb_serial: Optional[str] = None, probe_time: float = 0.0) -> None:
+        self.port = port
+        self.baud_rate = baud_rate
+        self.model = model
+        self.serial_number = serial_number
+        self.usb_serial = usb_serial
+        self.probe_time = probe_time
+
+    @property
+    def cache_key(self) -> str:
+        # USB adapters keep their serial number when they move between ports; anything else is keyed by device.
+        return self.usb_serial or f'port:{self.port}'
+
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            'port': self.port,
+            'baud_rate': self.baud_rate,
+            'model': self.model,
+            'serial_number': self.serial_number,
+            'usb_serial': self.usb_serial,
+        }
+
+
+def list_ports() -> Dict[str, Optional[str]]:
+    # Device name -> USB serial number (None for ports that are not USB adapters)
+    return {port.device: port.serial_number for port in serial.tools.list_ports.comports()}
+
+
+def probe(port: str, baud_rates=PROBE_BAUD_RATES, timeout: float = 0.2,
+          usb_serial: Optional[str] = None) -> Optional[DriveInfo]:
+    started = time.monotonic()
+    try:
+        with serial.Serial(port, baud_rates[0], timeout=timeout, write_timeout=timeout) as ser:
+            for baud_rate in baud_rates:
+                ser.baudrate = baud_rate
+                ser.reset_input_buffer()
+                ser.write(IDENTIFY)
+                model = ser.read_until(b'\r').decode(errors='replace').strip()
+                number = ser.read_until(b'\r').decode(errors='replace').strip()
+                if model.startswith('v ') and number.startswith('v '):
+                    try:
+                        serial_number = int(number[2:], 0)
+                    except ValueError:
+                        continue
+                    return DriveInfo(port, baud_rate, model[2:], serial_number, usb_serial,
+                                     time.monotonic() - started)
+    except (serial.SerialException, OSError) as e:
+        logging.debug(f" Failed to probe {port}: {e}")
+    return None
+
+
+def discover(ports: Optional[Dict[str, Optional[str]]] = None, baud_rates=PROBE_BAUD_RATES,
+             timeout: float = 0.2) -> List[DriveInfo]:
+    # Every port is probed on its own thread, so the wall time is that of the slowest port.
+    if ports is None:
+        ports = list_ports()
+    if not ports:
+        return []
+    with ThreadPoolExecutor(max_workers=len(ports)) as pool:
+        futures = [pool.submit(probe, port, baud_rates, timeout, usb_serial) for port, usb_serial in ports.items()]
+        return [drive for drive in (future.result() for future in futures) if drive is not None]
+
+
+def load_cache(path: str = DEFAULT_CACHE) -> Dict[str, Dict[str, object]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(drives: List[DriveInfo], path: str = DEFAULT_CACHE) -> None:
+    cache = load_cache(path)
+    cache.update((drive.cache_key, drive.to_dict()) for drive in drives)
+    with open(path, 'w') as f:
+        json.dump(cache, f, indent=2)
+
+
+def find_drive(serial_number: Optional[int] = None, ports: Optional[Dict[str, Optional[str]]] = None,
+               cache_path: Optional[str] = DEFAULT_CACHE, timeout: float = 0.2) -> DriveInfo:
+    # With no serial number, the only drive attached. Otherwise the cached port is checked first at its
+    # cached baud rate, and a full discovery only runs if the drive is no longer there.
+    if ports is None:
+        ports = list_ports()
+    if cache_path is not None and serial_number is not None:
+        for key, entry in load_cache(cache_path).items():
+            if entry.get('serial_number') != serial_number:
+                continue
+            # Follow a USB adapter to whichever port it is plugged into now
+            port = next((device for device, usb_serial in ports.items() if usb_serial and usb_serial == key),
+                        entry.get('port'))
+            if port not in ports:
+                continue
+            rates = (entry.get('baud_rate', DEFAULT_BAUD_RATE),) + PROBE_BAUD_RATES
+            drive = probe(port, tuple(dict.fromkeys(rates)), timeout, ports[port])
+            if drive is not None and drive.serial_number == serial_number:
+                save_cache([drive], cache_path)
+                return drive
+
+    drives = discover(ports, timeout=timeout)
+    if cache_path is not None and drives:
+        save_cache(drives, cache_path)
+    if serial_number is not None:
+        drives = [drive for drive in drives if drive.serial_number == serial_number]
+        if not drives:
+            raise DiscoveryError(f" Drive {serial_number} not found on {len(ports)} ports")
+    if not drives:
+        raise DiscoveryError(f" No drive found on {len(ports)} ports")
+    if len(drives) > 1:
+        raise DiscoveryError(f" {len(drives)} drives found, give a serial number: "
+                             f"{', '.join(str(drive.serial_number) for drive in drives)}")
+    return drives[0]
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Find Copley drives on every serial port at once')
+    parser.add_argument('-p', '--ports', nargs='+', help='Serial ports (default: every port on the system)')
+    parser.add_argument('--timeout', type=float, default=0.2, help='Reply timeout per baud rate (s)')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help='Port-to-drive cache file')
+    parser.add_argument('--no-cache', action='store_true', help='Do not update the cache file')
+    args = parser.parse_args()
+
+    ports = {port: None for port in args.ports} if args.ports else list_ports()
+    start = time.monotonic()
+    drives = discover(ports, timeout=args.timeout)
+    elapsed = time.monotonic() - start
+    if not args.no_cache and drives:
+        save_cache(drives, args.cache)
+
+    for drive in drives:
+        print(f" {drive.port}: {drive.model} serial {drive.serial_number} at {drive.baud_rate} baud"
+              f"{f' (USB {drive.usb_serial})' if drive.usb_serial else ''}")
+    print(f" {len(drives)} drives on {len(ports)} ports in {elapsed:.2f} s")
@@ -0,0 +1,179 @@
+import argparse
+import logging
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+SUB_BUCKET_BITS = 6
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS  # 64 sub-buckets per power of two, about 1.6% resolution
+
+
+class LatencyHistogram:
+    # HDR-style log-linear histogram of integer microseconds: exact below 128 us,
+    # then 64 linear sub-buckets per power of two.
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.counts: Dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    @staticmethod
+    def _index(value: int) -> int:
+        if value < 2 * SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return shift * SUB_BUCKETS + (value >> shift)
+
+    @staticmethod
+    def _upper(index: int) -> int:
+        if index < 2 * SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        return ((index - shift * SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, microseconds: int) -> None:
+        index = self._index(microseconds)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += microseconds
+        if self.min is None or microseconds < self.min:
+            self.min = microseconds
+        if self.max is None or microseconds > self.max:
+            self.max = microseconds
+
+    def percentile(self, percent: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, int(round(percent / 100.0 * self.count)))
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(self._upper(index), self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'min_us': self.min or 0,
+            'mean_us': self.total / self.count if self.count else 0.0,
+            'p50_us': self.percentile(50),
+            'p99_us': self.percentile(99),
+            'max_us': self.max or 0,
+        }
+
+
+def command_key(command: str) -> Tuple[str, Optional[int]]:
+    # 's r0xCA 100' -> ('s', 0xCA); 't 1' -> ('t', None)
+    parts = command.split()
+    if len(parts) > 1 and parts[1][:1].lower() == 'r':
+        try:
+            return parts[0], int(parts[1][1:], 0)
+        except ValueError:
+            pass
+    return parts[0] if parts else '', None
+
+
+class ProtocolStats:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms: Dict[Tuple[str, Optional[int]], LatencyHistogram] = {}
+            self.bytes_written = 0
+            self.bytes_read = 0
+            self.exchanges = 0
+            self.timeouts = 0
+            self.error_replies = 0
+            self.started = time.monotonic()
+
+    def record(self, command: str, response: str, seconds: float, size: Optional[int] = None) -> None:
+        key = command_key(command)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = LatencyHistogram()
+            histogram.record(int(seconds * 1e6))
+            self.bytes_read += len(response) + 1 if size is None else size
+            if not response:
+                self.timeouts += 1
+            elif response.startswith('e'):
+                self.error_replies += 1
+
+    def wrote(self, count: int) -> None:
+        with self._lock:
+            self.bytes_written += count
+            self.exchanges += 1
+
+    def snapshot(self, reset: bool = False) -> Dict[str, object]:
+        with self._lock:
+            commands = {}
+            for (verb, register), histogram in sorted(self.histograms.items(), key=lambda item: str(item[0])):
+                name = verb if register is None else f'{verb} r0x{register:X}'
+                commands[name] = histogram.summary()
+            snapshot = {
+                'elapsed_s': time.monotonic() - self.started,
+                'bytes_written': self.bytes_written,
+                'bytes_read': self.bytes_read,
+                'exchanges': self.exchanges,
+                'timeouts': self.timeouts,
+                'error_replies': self.error_replies,
+                'commands': commands,
+            }
+        if reset:
+            self.reset()
+        return snapshot
+
+    def log_summary(self) -> None:
+        snapshot = self.snapshot()
+        total = sum(entry['count'] for entry in snapshot['commands'].values())
+        logging.info(f" Serial link: {total} commands in {snapshot['elapsed_s']:.2f} s, "
+                     f"{snapshot['bytes_written']} bytes written, {snapshot['bytes_read']} bytes read, "
+                     f"{snapshot['timeouts']} timeouts, {snapshot['error_replies']} error replies")
+        for name, entry in snapshot['commands'].items():
+            logging.info(f" {name}: {entry['count']} x, mean {entry['mean_us'] / 1000:.2f} ms, "
+                         f"p50 {entry['p50_us'] / 1000:.2f} ms, p99 {entry['p99_us'] / 1000:.2f} ms, "
+                         f"max {entry['max_us'] / 1000:.2f} ms")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Measure the overhead of CopMotor instrumentation')
+    parser.add_argument('-n', '--count', type=int, default=200, help='Commands per measurement')
+    parser.add_argument('-b', '--baud-rate', type=int, default=9600, help='Simulated drive baud rate')
+    args = parser.parse_args()
+
+    from motor import CopMotor
+    from simulator import CopleySimulator
+
+    stats = ProtocolStats()
+    start = time.perf_counter()
+    for _ in range(100000):
+        stats.record('g r0x32', 'v 100', 0.0125)
+    record_cost = (time.perf_counter() - start) / 100000
+    stats.reset()
+
+    with CopleySimulator(baud_rate=args.baud_rate) as sim:
+        dev = CopMotor(sim.port, baud_rate=sim.baud_rate)  # the simulator ignores commands sent at any other rate
+        rates = {}
+        for label in ('plain', 'instrumented'):
+            if label == 'instrumented':
+                dev.instrument(stats)
+            start = time.perf_counter()
+            for _ in range(args.count):
+                dev.get('r0x32')
+            rates[label] = (time.perf_counter() - start) / args.count
+        dev._dev.close()
+
+    print(f" Recording cost: {record_cost * 1e6:.2f} us per command")
+    print(f" Round trip: {rates['plain'] * 1000:.3f} ms plain, {rates['instrumented'] * 1000:.3f} ms instrumented")
+    print(f" Overhead: {record_cost / rates['plain'] * 100:.3f}% of a {args.baud_rate}-baud round trip")
+    stats.log_summary()
@@ -4,5 +4,6 @@ def list_serial_ports():
     ports = serial.tools.list_ports.comports()
     return [port.device for port in ports]
 
-available_ports = list_serial_ports()
-print("Available serial ports:", available_ports)
\ No newline at end of file
+if __name__ == "__main__":
+    available_ports = list_serial_ports()
+    print("Available serial ports:", available_ports)
@@ -1,11 +1,45 @@
 import logging
 import argparse
 import serial
+import threading
 import time
 import sys
-from typing import Optional
+from typing import List, Optional, Tuple
 
 PORT = 'COM3'
+DEFAULT_SOCKET = '/tmp/motord.sock'
+
+# Model STA1112 Limitations
+MAX_VELOCITY_MpS = 5.4
+MAX_ACCELERATION_MpS2 = 378
+MAX_DECELERATION_MpS2 = 378
+MAX_DESIRED_TIME_S = 100000
+MAX_DELTA_UNITS = 300
+SCALE_FACTOR = .00625
+CAP_FACTOR = .05088
+TIME_FACTOR = 12.5
+
+MAX_VELOCITY_UNITS_SCALED = MAX_VELOCITY_MpS / SCALE_FACTOR
+SET_ACCELERATION_UNITS_FIXED = 100
+SET_DECELERATION_UNITS_FIXED = 100
+SET_ACCELERATION_UNITS_MpS2 = SET_ACCELERATION_UNITS_FIXED * SCALE_FACTOR
+SET_DECELERATION_UNITS_MpS2 = SET_DECELERATION_UNITS_FIXED * SCALE_FACTOR
+
+# Copley register units: 0xCB in 0.1 counts/s, 0xCC / 0xCD in 10 counts/s^2
+VELOCITY_UNIT = 0.1
+ACCELERATION_UNIT = 10.0
+
+TRAJECTORY_IN_MOTION = 1 << 15
+EVENT_IN_MOTION = 1 << 27
+# Serial rates supported by the drive's r0x90 register, fastest first. The drive powers up at 9600.
+BAUD_RATES = (115200, 57600, 38400, 19200, 9600)
+DEFAULT_BAUD_RATE = 9600
+
+# Writable registers whose last acknowledged value is shadowed so identical writes can be skipped
+CACHED_REGISTERS = (0xC4, 0xC8, 0xCA, 0xCB, 0xCC, 0xCD)
+
+# Short circuit, over temperature, over/under voltage, feedback, phasing, tracking error, drive fault, command input fault
+EVENT_FAULT_MASK = 0x0F | (1 << 5) | (1 << 6) | (1 << 18) | (1 << 22) | (1 << 30)
 
 class CopMotorError(Exception):
     pass
@@ -13,64 +47,346 @@ class CopMotorError(Exception):
 class CopMotorError(Exception):
     pass
 
+class CopMotorPipelineError(CopMotorError):
+    def __init__(self, index: int, command: str, response: str) -> None:
+        super().__init__(f" Failed command {index}: {command}. Response: {response}")
+        self.index = index
+        self.command = command
+        self.response = response
+
+def move_duration(distance: float, velocity: float, acceleration: float, deceleration: float) -> float:
+    # Trapezoidal move time from rest to rest, distance in counts and limits in drive register units
+    distance = abs(distance)
+    velocity *= VELOCITY_UNIT
+    acceleration *= ACCELERATION_UNIT
+    deceleration *= ACCELERATION_UNIT
+    if distance == 0:
+        return 0.0
+    if velocity <= 0 or acceleration <= 0 or deceleration <= 0:
+        return float('inf')
+    ramp_distance = velocity * velocity / (2 * acceleration) + velocity * velocity / (2 * deceleration)
+    if ramp_distance >= distance:
+        peak = (2 * distance / (1 / acceleration + 1 / deceleration)) ** 0.5
+        return peak / acceleration + peak / deceleration
+    return velocity / acceleration + velocity / deceleration + (distance - ramp_distance) / velocity
+
+class AsciiProtocol:
+    # The drive's ASCII command format: 's r0xCA 100' -> 'ok', 'g r0x32' -> 'v 1234', one line each way.
+
+    name = 'ascii'
+
+    def encode(self, command: str) -> bytes:
+        return command.encode() + b'\r'
+
+    def read_reply(self, dev) -> Tuple[str, int]:
+        data = dev.read_until(b'\r')
+        return data.decode().strip(), len(data)
+
+    def reset(self) -> None:
+        pass
+
+
+def make_protocol(protocol):
+    # 'ascii', 'binary', or a protocol object with encode/read_reply/reset
+    if protocol == 'ascii':
+        return AsciiProtocol()
+    if protocol == 'binary':
+        from binary_protocol import BinaryProtocol
+        return BinaryProtocol()
+    return protocol
+
+
 class CopMotor:
-    def __init__(self, port) -> None:
-        self._dev = serial.Serial(timeout=15)  # 15 second timeout
+    def __init__(self, port, upgrade_baud_rate: bool = False, protocol='ascii',
+                 capture: Optional[str] = None, baud_rate: int = DEFAULT_BAUD_RATE) -> None:
+        self._dev = serial.Serial(baudrate=baud_rate, timeout=15)  # 15 second timeout
+        self._protocol = make_protocol(protocol)
+        if capture is not None:
+            from capture import CaptureSerial
+            self._dev = CaptureSerial(self._dev, capture, getattr(self._protocol, 'name', 'custom'))
         self._scale_factor = 0.00625
+        self._commanded = {}  # last values written to each register
+        self._shadow = {}  # register cache: values the drive is known to hold
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self._move_started = None
+        self._lock = threading.RLock()  # one request/reply exchange on the link at a time
+        self._stats = None  # instrumentation.ProtocolStats when instrumented
 
         try:
             if port is not None:
                 self._dev.port = port
                 self.open()
+                if upgrade_baud_rate:
+                    self.upgrade_baud_rate()
             else:
                 self._port = ''
         except serial.SerialException as e:
             logging.error(f" Failed to open serial port {port}: {e}")
             raise
 
+    @classmethod
+    def open_drive(cls, serial_number: Optional[int] = None, upgrade_baud_rate: bool = False,
+                   protocol='ascii') -> 'CopMotor':
+        # Open a drive by its serial number (0x81) on whichever port it is attached to.
+        # With no serial number, the only drive attached.
+        from discovery import find_drive
+        drive = find_drive(serial_number)
+        logging.info(f" Found drive {drive.serial_number} on {drive.port} at {drive.baud_rate} baud")
+        dev = cls(None, protocol=protocol, baud_rate=drive.baud_rate)
+        dev._dev.port = drive.port
+        dev.open()
+        if upgrade_baud_rate:
+            dev.upgrade_baud_rate()
+        return dev
+
+    @classmethod
+    def replay(cls, path: str, realtime: bool = True) -> 'CopMotor':
+        # A CopMotor whose drive is a capture file recorded with capture=path
+        from capture import ReplaySerial
+        replay = ReplaySerial(path, realtime)
+        dev = cls(None, protocol=replay.protocol)
+        dev._dev = replay
+        return dev
+
     def _log_str(self, data) -> str:
         return data
 
     def open(self) -> None:
+        self.invalidate_cache()
         self._dev.open()
 
+    def close(self) -> None:
+        if self._dev.is_open:
+            self.restore_baud_rate()
+            self._dev.close()
+
     def write(self, data: str) -> None:
         logging.debug('write: %s', data)
-        self._dev.write(data.encode() + b'\r')
+        self._dev.write(self._protocol.encode(data))
 
     def read(self) -> str:
-        data = self._dev.read_until(b'\r').decode().strip()
+        return self._read()[0]
+
+    def _read(self) -> Tuple[str, int]:
+        data, size = self._protocol.read_reply(self._dev)
         logging.debug('read: %s', data)
-        return data
+        return data, size
+
+    def instrument(self, stats=None):
+        if stats is None:
+            from instrumentation import ProtocolStats
+            stats = ProtocolStats()
+        self._stats = stats
+        return stats
+
+    def _exchange(self, commands: List[str]) -> List[str]:
+        # Write every command back to back, then read one reply per command.
+        with self._lock:
+            for command in commands:
+                logging.debug('write: %s', command)
+            payload = b''.join(self._protocol.encode(command) for command in commands)
+            started = time.perf_counter()
+            self._dev.write(payload)
+            responses = []
+            for command in commands:
+                response, size = self._read()
+                if self._stats is not None:
+                    self._stats.record(command, response, time.perf_counter() - started, size)
+                responses.append(response)
+                if not response:
+                    # Timed out, or cancelled by abort(): do not wait out the timeout again for each
+                    # remaining reply.
+                    responses += [''] * (len(commands) - len(responses))
+                    break
+            if self._stats is not None:
+                self._stats.wrote(len(payload))
+        return responses
+
+    def _parse_set(self, data: str):
+        register, value = data.split()
+        return int(register[1:], 0), int(value)
+
+    def _remember(self, data: str) -> None:
+        register, value = self._parse_set(data)
+        self._commanded[register] = value
+        if register in CACHED_REGISTERS:
+            self._shadow[register] = value
+        elif register == 0x24 and value == 0:
+            self.invalidate_cache()
+
+    def _cached(self, data: str) -> bool:
+        register, value = self._parse_set(data)
+        if register not in CACHED_REGISTERS:
+            return False
+        if self._shadow.get(register) == value:
+            self.cache_hits += 1
+            return True
+        self.cache_misses += 1
+        return False
+
+    def invalidate_cache(self) -> None:
+        self._shadow.clear()
+
+    def cache_stats(self) -> dict:
+        return {'hits': self.cache_hits, 'misses': self.cache_misses, 'registers': dict(self._shadow)}
 
     def set(self, data: str) -> None:
-        self.write('s ' + data)
-        response = self.read()
+        if self._cached(data):
+            return
+        response = self._exchange(['s ' + data])[0]
         if response != 'ok' and response != 'k':
+            self.invalidate_cache()
             raise CopMotorError(f" Failed to set command: {data}. Response: {response}")
+        self._remember(data)
 
     def get(self, data: str) -> Optional[str]:
-        self.write('g ' + data)
-        response = self.read()
+        response = self._exchange(['g ' + data])[0]
         if response.startswith('v '):
             return response.split(' ')[1]
         else:
+            # An error reply (or none) leaves the drive's state in doubt
+            self.invalidate_cache()
             logging.error(f" Unexpected response: {response}")
             return None
 
+    def pipeline(self, commands: List[str]) -> List[str]:
+        # Match the replies to the pipelined commands in order. Writes the register cache
+        # says are redundant are not sent and report 'ok'.
+        send = [not (command.startswith('s ') and self._cached(command[2:])) for command in commands]
+        sent = [command for command, flag in zip(commands, send) if flag]
+        responses = iter(self._exchange(sent) if sent else [])
+
+        results = []
+        for index, command in enumerate(commands):
+            if not send[index]:
+                results.append('ok')
+                continue
+            response = next(responses)
+            if command.startswith('g '):
+                if not response.startswith('v '):
+                    self._pipeline_failed(commands, send, index, response)
+                results.append(response.split(' ')[1])
+            else:
+                if response != 'ok' and response != 'k':
+                    self._pipeline_failed(commands, send, index, response)
+                if command.startswith('s '):
+                    self._remember(command[2:])
+                elif command == 't 1':
+                    self._move_started = time.monotonic()
+                results.append(response)
+        return results
+
+    def _pipeline_failed(self, commands: List[str], send: List[bool], index: int, response: str) -> None:
+        self.invalidate_cache()
+        if any(send[later] and commands[later] == 't 1' for later in range(index + 1, len(commands))):
+            # A trajectory pipelined after the failed command has already started a move from the
+            # registers as they were (e.g. the previous distance, opposite sign): stop it first.
+            self._exchange(['t 0'])
+        raise CopMotorPipelineError(index, commands[index], response)
+
+    def poll(self, commands: List[str], lock_timeout: float, read_timeout: float = 0.25) -> Optional[List[str]]:
+        # Like pipeline, but never blocks for long: returns None if another exchange holds the
+        # link past lock_timeout, and fails if the drive takes longer than read_timeout to reply.
+        if not self._lock.acquire(timeout=lock_timeout):
+            return None
+        saved_timeout = self._dev.timeout
+        self._dev.timeout = read_timeout
+        try:
+            return self.pipeline(commands)
+        except CopMotorError:
+            # A reply that missed read_timeout may still arrive; take replies off the link until it
+            # has been quiet for a while, before the next exchange would read one as its own.
+            self._dev.timeout = max(read_timeout, 0.25)
+            while self.read():
+                pass
+            self._dev.reset_input_buffer()
+            self._protocol.reset()
+            raise
+        finally:
+            self._dev.timeout = saved_timeout
+            self._lock.release()
+
+    def abort(self, timeout: float = 0.5) -> float:
+        # Disable the drive now, even if another thread is blocked waiting for a reply.
+        # Returns the seconds taken to put the disable command on the wire.
+        started = time.perf_counter()
+        self._dev.cancel_read()
+        self._dev.write(self._protocol.encode('s r0x24 0'))
+        self._dev.flush()
+        latency = time.perf_counter() - started
+        logging.warning(f" Drive disable sent by abort in {latency * 1000:.3f} ms")
+        self.invalidate_cache()
+
+        # Consume the replies owed to the cancelled exchange and to the abort itself.
+        if self._lock.acquire(timeout=timeout):
+            saved_timeout = self._dev.timeout
+            self._dev.timeout = timeout
+            try:
+                deadline = time.monotonic() + timeout
+                while time.monotonic() < deadline and self.read() != 'ok':
+                    pass
+                self._dev.reset_input_buffer()
+                self._protocol.reset()
+            finally:
+                self._dev.timeout = saved_timeout
+                self._lock.release()
+        return latency
+
     def check_response(self, command: str) -> None:
         response = self.read()
         if response != 'ok':
             raise CopMotorError(f" Failed command: {command}. Response: {response}")
 
     def trajectory(self) -> None:
-        self.write('t 1')
-        self.check_response('t 1')
+        response = self._exchange(['t 1'])[0]
+        if response != 'ok':
+            self.invalidate_cache()
+            raise CopMotorError(f" Failed command: t 1. Response: {response}")
+        self._move_started = time.monotonic()
+
+    def predicted_move_time(self) -> float:
+        return move_duration(self._commanded.get(0xCA, 0), self._commanded.get(0xCB, 0),
+                             self._commanded.get(0xCC, 0), self._commanded.get(0xCD, 0))
+
+    def wait_for_move(self, timeout: Optional[float] = None, fast_interval: float = 0.005,
+                      slow_interval: float = 0.25, heartbeat=None) -> float:
+        # Poll trajectory status and event register together, slowly until the predicted end of move, then fast.
+        started = self._move_started if self._move_started is not None else time.monotonic()
+        predicted_end = started + self.predicted_move_time()
+        if timeout is None:
+            timeout = 2 * self.predicted_move_time() + 1.0
+        deadline = started + timeout
+
+        while True:
+            now = time.monotonic()
+            remaining = predicted_end - now
+            if remaining > 0:
+                pause = min(max(remaining / 2, fast_interval), slow_interval)
+                if heartbeat is not None:
+                    heartbeat(now + pause)
+                time.sleep(pause)
+            status, event = self.pipeline(['g r0xC9', 'g r0xA0'])
+            status, event = int(status), int(event)
+            if heartbeat is not None:
+                heartbeat()
+            if event & EVENT_FAULT_MASK:
+                raise CopMotorError(f" Drive fault during move. Event register: {event:x}")
+            if not status & TRAJECTORY_IN_MOTION and not event & EVENT_IN_MOTION:
+                return time.monotonic() - started
+            if time.monotonic() >= deadline:
+                raise CopMotorError(f" Move did not complete within {timeout:.3f} seconds")
+            if remaining <= 0:
+                time.sleep(fast_interval)
 
     def set_mode_relative_move(self):
         logging.info(self._log_str(" Set mode relative move"))
         self.set('r0xC8 256')
 
+    def set_mode_absolute_move(self):
+        logging.info(self._log_str(" Set mode absolute move"))
+        self.set('r0xC8 0')
+
     def set_mode_programmed_position(self):
         logging.info(self._log_str(" Set mode programmed position"))
         self.set('r0xC4 21')
@@ -81,6 +397,25 @@ class CopMotor:
         # logging.info(self._log_str(f"set relative move: {x}"))
         self.set(f"r0xCA {x}")
 
+    def start_relative_move(self, data, direction=1):
+        x = int(data / self._scale_factor)
+        x *= direction
+        self.pipeline([f"s r0xCA {x}", 't 1'])
+
+    def configure_profile(self, velocity: float, acceleration: float, deceleration: float):
+        logging.info(self._log_str(" Configure profile and programmed position mode"))
+        try:
+            self.pipeline([
+                f"s r0xCC {int(acceleration / self._scale_factor)}",
+                f"s r0xCD {int(deceleration / self._scale_factor)}",
+                f"s r0xCB {int(velocity / self._scale_factor)}",
+                's r0xC8 256',
+                's r0xC4 21',
+            ])
+        except CopMotorError as e:
+            logging.error(f" Failed to configure profile: {e}")
+            raise
+
     def set_profile_velocity(self, data: float):
         x = int(data / self._scale_factor)
         # logging.info(self._log_str(f" Set profile velocity: {x}"))
@@ -174,6 +509,76 @@ class CopMotor:
             logging.error(f" Error getting trajectory status register: {e}")
             return None
 
+    def measure_round_trip(self, count: int = 10) -> float:
+        start = time.perf_counter()
+        for _ in range(count):
+            if self.get('r0x90') is None:
+                raise CopMotorError(f" No response at {self._dev.baudrate} baud")
+        return (time.perf_counter() - start) / count
+
+    def _switch_baud_rate(self, rate: int) -> bool:
+        # The drive acknowledges at the old rate, then listens at the new one.
+        with self._lock:
+            self.set(f"r0x90 {rate}")
+            self._dev.flush()
+            self._dev.baudrate = rate
+            return self._verify_baud_rate(rate)
+
+    def _verify_baud_rate(self, rate: int) -> bool:
+        timeout = self._dev.timeout
+        self._dev.timeout = 0.5
+        try:
+            self._dev.reset_input_buffer()
+            self._protocol.reset()
+            return self.get('r0x90') == str(rate)
+        finally:
+            self._dev.timeout = timeout
+
+    def _recover_baud_rate(self, rate: int) -> bool:
+        with self._lock:
+            self._dev.baudrate = rate
+            if self._verify_baud_rate(rate):
+                return True
+            # A serial break resets the drive to its default rate.
+            logging.warning(f" No response at {rate} baud, sending break to reset the drive to {DEFAULT_BAUD_RATE} baud")
+            self._dev.baudrate = DEFAULT_BAUD_RATE
+            self._dev.send_break(0.25)
+            time.sleep(0.1)
+            return self._verify_baud_rate(DEFAULT_BAUD_RATE)
+
+    def upgrade_baud_rate(self, rates=BAUD_RATES) -> int:
+        current = self._dev.baudrate
+        before = self.measure_round_trip()
+        for rate in sorted(rates, reverse=True):
+            if rate <= current:
+                break
+            try:
+                switched = self._switch_baud_rate(rate)
+            except CopMotorError as e:
+                logging.info(f" Drive rejected {rate} baud: {e}")
+                continue
+            if switched:
+                after = self.measure_round_trip()
+                logging.info(f" Serial link upgraded to {rate} baud. Round trip: {before * 1000:.2f} ms at {current} baud, "
+                             f"{after * 1000:.2f} ms at {rate} baud")
+                return rate
+            logging.warning(f" Drive did not answer at {rate} baud, falling back to {current} baud")
+            if not self._recover_baud_rate(current):
+                raise CopMotorError(" Lost contact with the drive while changing baud rate")
+            current = self._dev.baudrate
+        return current
+
+    def restore_baud_rate(self) -> None:
+        # Leave the drive at its default rate so other tools can talk to it.
+        if self._dev.baudrate == DEFAULT_BAUD_RATE:
+            return
+        try:
+            if not self._switch_baud_rate(DEFAULT_BAUD_RATE):
+                self._recover_baud_rate(DEFAULT_BAUD_RATE)
+            logging.info(f" Serial link restored to {DEFAULT_BAUD_RATE} baud")
+        except (CopMotorError, serial.SerialException) as e:
+            logging.error(f" Failed to restore {DEFAULT_BAUD_RATE} baud: {e}")
+
     def enable_drive(self) -> None:
         logging.info(self._log_str(" Enable drive"))
         try:
@@ -191,6 +596,7 @@ class CopMotor:
         except CopMotorError as e:
             logging.error(f" Failed to disable drive: {e}")
             raise  # Raise the exception to propagate the error
+        self.restore_baud_rate()
 
 def valid_input(prompt, min, max):
     while True:
@@ -242,6 +648,12 @@ def parse_arguments():
     parser.add_argument('-d', '--deceleration', type=float, help=f'Motor DECELERATION (0 - {SET_DECELERATION_UNITS_FIXED} Units (0 - {SET_DECELERATION_UNITS_MpS2} m/s^2)')
     parser.add_argument('-t', '--desired-time', type=float, help=f'Motor RUN TIME (0 - {MAX_DESIRED_TIME_S} s)')
     parser.add_argument('-dist', '--delta', type=float, help=f'Motor LOWER BOUND (+0 - +{MAX_DELTA_UNITS} Units)')
+    parser.add_argument('-s', '--socket', nargs='?', const=DEFAULT_SOCKET, help=f'Run through the motord.py daemon (default socket {DEFAULT_SOCKET})')
+    parser.add_argument('--capture', help='Record every serial write and read to this file')
+    parser.add_argument('--replay', help='Run against a capture file instead of the drive')
+    parser.add_argument('--fast', action='store_true', help='Replay without the recorded link delays')
+    parser.add_argument('--correct', action='store_true', help='Correct stroke length, zero point and period from the measured load position')
+    parser.add_argument('--fast-link', action='store_true', help='Upgrade the serial baud rate on connect')
 
     args = parser.parse_args()
 
@@ -252,15 +664,20 @@ def parse_arguments():
     desired_time = args.desired_time if args.desired_time is not None else args.DESIRED_TIME
     delta = args.delta if args.delta is not None else args.DELTA
 
-    return velocity, acceleration, deceleration, desired_time, delta
+    return (velocity, acceleration, deceleration, desired_time, delta, args.socket, args.capture, args.replay, args.fast,
+            args.correct, args.fast_link)
+
+def check_args(velocity, acceleration, deceleration, desired_time, delta):
+    # Raises AssertionError describing the first value outside the STA1112 limits
+    assert 0 <= velocity <= MAX_VELOCITY_UNITS_SCALED, f"ERROR: VELOCITY must be between 0 and {MAX_VELOCITY_UNITS_SCALED} Units (0 - {MAX_VELOCITY_MpS * CAP_FACTOR: .3f}) m/s"
+    assert 0 <= acceleration <= SET_ACCELERATION_UNITS_FIXED, f"ERROR: ACCELERATION must be between 0 and {SET_ACCELERATION_UNITS_FIXED} Units (0 - {SET_ACCELERATION_UNITS_MpS2}) m/s^2"
+    assert 0 <= deceleration <= SET_DECELERATION_UNITS_FIXED, f"ERROR: DECELERATION must be between 0 and {SET_DECELERATION_UNITS_FIXED} Units (0 - {SET_DECELERATION_UNITS_MpS2}) m/s^2"
+    assert 0 <= desired_time <= MAX_DESIRED_TIME_S, f"ERROR: DESIRED_TIME must be between 0 and {MAX_DESIRED_TIME_S} seconds"
+    assert 0 <= delta <= MAX_DELTA_UNITS, f"ERROR: DIST must be between 0 and {MAX_DELTA_UNITS} Units"
 
 def validate_args(velocity, acceleration, deceleration, desired_time, delta):
     try:
-        assert 0 <= velocity <= MAX_VELOCITY_UNITS_SCALED, f"ERROR: VELOCITY must be between 0 and {MAX_VELOCITY_UNITS_SCALED} Units (0 - {MAX_VELOCITY_MpS * CAP_FACTOR: .3f}) m/s"
-        assert 0 <= acceleration <= SET_ACCELERATION_UNITS_FIXED, f"ERROR: ACCELERATION must be between 0 and {SET_ACCELERATION_UNITS_FIXED} Units (0 - {SET_ACCELERATION_UNITS_MpS2}) m/s^2"
-        assert 0 <= deceleration <= SET_DECELERATION_UNITS_FIXED, f"ERROR: DECELERATION must be between 0 and {SET_DECELERATION_UNITS_FIXED} Units (0 - {SET_DECELERATION_UNITS_MpS2}) m/s^2"
-        assert 0 <= desired_time <= MAX_DESIRED_TIME_S, f"ERROR: DESIRED_TIME must be between 0 and {MAX_DESIRED_TIME_S} seconds"
-        assert 0 <= delta <= MAX_DELTA_UNITS, f"ERROR: DIST must be between 0 and {MAX_DELTA_UNITS} Units"
+        check_args(velocity, acceleration, deceleration, desired_time, delta)
     except AssertionError as e:
         logging.error(f"Validation error: {e}")
         sys.exit(1)
@@ -268,25 +685,9 @@ def validate_args(velocity, acceleration, deceleration, desired_time, delta):
 if __name__ == "__main__":
     logging.basicConfig(level=logging.INFO)
 
-    # Model STA1112 Limitations
-    MAX_VELOCITY_MpS = 5.4
-    MAX_ACCELERATION_MpS2 = 378
-    MAX_DECELERATION_MpS2 = 378
-    MAX_DESIRED_TIME_S = 100000
-    MAX_DELTA_UNITS = 300
-    SCALE_FACTOR = .00625
-    CAP_FACTOR = .05088
-    TIME_FACTOR = 12.5
-
-    MAX_VELOCITY_UNITS_SCALED = MAX_VELOCITY_MpS / SCALE_FACTOR
-    SET_ACCELERATION_UNITS_FIXED = 100
-    SET_DECELERATION_UNITS_FIXED = 100
-    SET_ACCELERATION_UNITS_MpS2 = SET_ACCELERATION_UNITS_FIXED * SCALE_FACTOR
-    SET_DECELERATION_UNITS_MpS2 = SET_DECELERATION_UNITS_FIXED * SCALE_FACTOR
-    
-
     try:
-        velocity, acceleration, deceleration, desired_time, delta = parse_arguments()
+        (velocity, acceleration, deceleration, desired_time, delta, socket_path, capture_path, replay_path, fast,
+         correct, fast_link) = parse_arguments()
 
         # If any required argument is missing, prompt user for input
         if None in (velocity, acceleration, deceleration, desired_time, delta):
@@ -299,8 +700,25 @@ if __name__ == "__main__":
         # Validate input arguments
         validate_args(velocity, acceleration, deceleration, desired_time, delta)
 
+        # Hand the run to a daemon that already owns the drive
+        if socket_path is not None:
+            from motord import request_run
+            sys.exit(0 if request_run(socket_path, velocity, acceleration, deceleration, desired_time, delta) else 1)
+
+        # The corrector paces strokes from the wall-clock slack between moves, which a fast replay does not keep
+        if correct and replay_path is not None and fast:
+            logging.error(" A --correct run can only be replayed in real time (without --fast)")
+            sys.exit(1)
+
         # Initialize CopMotor object
-        dev = CopMotor(PORT)
+        if replay_path is not None:
+            dev = CopMotor.replay(replay_path, realtime=not fast)
+            if fast_link:
+                dev.upgrade_baud_rate()
+        else:
+            dev = CopMotor(PORT, upgrade_baud_rate=fast_link, capture=capture_path)
+
+        stats = dev.instrument()
 
         # Perform motor control operations
         given_velocity = velocity * SCALE_FACTOR * CAP_FACTOR
@@ -318,36 +736,55 @@ if __name__ == "__main__":
 
         
 
+        drive_disabled = False
         try:
-            dev.set_profile_acceleration(acceleration)
-            dev.set_profile_deceleration(deceleration)
-            dev.set_profile_velocity(velocity)
-            dev.set_mode_relative_move()
-            dev.set_mode_programmed_position()
+            dev.configure_profile(velocity, acceleration, deceleration)
 
             time.sleep(1)
 
             dev.enable_drive()
             event_register_before = dev.get_event_register()
 
-            current_direction = 1
             initial_motor_position = dev.get_motor_position()
             specified_lower_bound = initial_motor_position + delta
 
+            from oscillation import OscillationEngine, StrokeSchedule
+            schedule = StrokeSchedule(delta, velocity, acceleration, deceleration, desired_time, SCALE_FACTOR)
+            logging.info(f" Planned {len(schedule)} strokes, period {schedule.period:.4f} seconds")
+
+            from safety import SafetyWatchdog
+            # A replay has no drive to protect, and the watchdog's reads depend on timing
+            watchdog = SafetyWatchdog(dev, initial_motor_position, specified_lower_bound,
+                                      read_drive=replay_path is None)
+
+            corrector = None
+            if correct:
+                from correction import StrokeCorrector
+                corrector = StrokeCorrector(dev, initial_motor_position, delta, velocity, acceleration, deceleration)
+
             start_time = time.time()
-            while True:
-                dev.set_relative_move(delta, current_direction)
-                dev.trajectory()
-                motor_position = dev.get_motor_position()
-                if current_direction == 1 and motor_position >= specified_lower_bound:
-                    current_direction = -1
-                elif current_direction == -1 and motor_position <= initial_motor_position:
-                    current_direction = 1
-                if time.time() - start_time >= desired_time:
-                    break
+            report = None
+            with watchdog:
+                try:
+                    report = OscillationEngine(dev, schedule, stop=watchdog.tripped, heartbeat=watchdog.heartbeat,
+                                               corrector=corrector).run()
+                except CopMotorError:
+                    # An abort cancels the control loop's exchange in flight
+                    if not watchdog.tripped.is_set():
+                        raise
+            if watchdog.tripped.is_set():
+                logging.error(f" Safety watchdog disabled the drive: {watchdog.reason}")
+                if watchdog.abort_latency is not None:
+                    logging.error(f" Abort latency: {watchdog.abort_latency * 1000:.3f} ms")
 
             elapsed_time = time.time() - start_time
             logging.info(f" Elapsed time: {elapsed_time:.2f} seconds")
+            if report is not None:
+                report.log()
+            if corrector is not None:
+                corrector.report().log()
+            stats.log_summary()
+            logging.info(f" Register cache: {dev.cache_hits} hits, {dev.cache_misses} misses")
 
         except KeyboardInterrupt:
             logging.info(" Interrupt detected. Attempting to disable drive...")
@@ -366,6 +803,9 @@ if __name__ == "__main__":
                     logging.info(" Drive disabled successfully.")
                 except Exception as e:
                     logging.error(f" Error occurred while disabling drive: {e}")
+            if capture_path is not None:
+                dev.close()
+                logging.info(f" Serial session captured to {capture_path}")
 
 
     except Exception as e:
@@ -0,0 +1,98 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import socketserver
+import threading
+from typing import Dict, Optional
+
+from motor import DEFAULT_SOCKET, PORT
+from session import RUN_FIELDS, MotorDaemon
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        daemon = self.server.daemon_state
+        for line in self.rfile:
+            try:
+                message = json.loads(line)
+                command = message.get('cmd')
+            except (ValueError, AttributeError):
+                reply = {'ok': False, 'error': "Malformed request"}
+            else:
+                if command == 'run':
+                    reply = daemon.run(message)
+                elif command == 'stop':
+                    reply = daemon.stop()
+                elif command == 'status':
+                    reply = daemon.status()
+                elif command == 'shutdown':
+                    reply = {'ok': True}
+                    threading.Thread(target=self.server.shutdown, daemon=True).start()
+                else:
+                    reply = {'ok': False, 'error': f"Unknown command: {command}"}
+            self.wfile.write(json.dumps(reply).encode() + b'\n')
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(daemon: MotorDaemon, socket_path: str) -> None:
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = _Server(socket_path, _Handler)
+    server.daemon_state = daemon
+    threading.Thread(target=daemon.watch_idle, name='idle-watch', daemon=True).start()
+    logging.info(f" Listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.unlink(socket_path)
+        daemon.close()
+
+
+def request(socket_path: str, message: Dict[str, object], timeout: Optional[float] = None) -> Dict[str, object]:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.settimeout(timeout)
+        client.connect(socket_path)
+        client.sendall(json.dumps(message).encode() + b'\n')
+        with client.makefile('rb') as reply:
+            return json.loads(reply.readline())
+
+
+def request_run(socket_path: str, velocity: float, acceleration: float, deceleration: float,
+                desired_time: float, delta: float) -> bool:
+    message = dict(zip(RUN_FIELDS, (velocity, acceleration, deceleration, desired_time, delta)), cmd='run')
+    try:
+        reply = request(socket_path, message)
+    except KeyboardInterrupt:
+        logging.info(" Interrupt detected. Asking the daemon to stop the run...")
+        request(socket_path, {'cmd': 'stop'})
+        return False
+    if not reply.get('ok'):
+        logging.error(f" Daemon run failed: {reply.get('error')}")
+        return False
+    logging.info(f" Startup to first stroke: {reply['startup_s'] * 1000:.2f} ms")
+    logging.info(f" Strokes dispatched: {reply['strokes']}")
+    logging.info(f" Planned period: {reply['planned_period_s']:.4f} s, achieved period: {reply['achieved_period_s']:.4f} s")
+    logging.info(f" Phase drift: {reply['final_drift_s'] * 1000:.2f} ms final, {reply['max_drift_s'] * 1000:.2f} ms max")
+    return True
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Keep the drive connection open and accept runs over a Unix socket')
+    parser.add_argument('-p', '--port', default=PORT, help='Serial port')
+    parser.add_argument('-s', '--socket', default=DEFAULT_SOCKET, help='Unix socket path')
+    parser.add_argument('--idle-disable', type=float, default=300.0, help='Disable the drive after this many idle seconds')
+    parser.add_argument('--fast-link', action='store_true', help='Upgrade the serial baud rate on connect')
+    args = parser.parse_args()
+
+    try:
+        serve(MotorDaemon(args.port, args.idle_disable, args.fast_link), args.socket)
+    except KeyboardInterrupt:
+        logging.info(" Interrupt detected. Drive disabled and daemon stopped.")
@@ -0,0 +1,146 @@
+import argparse
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from discovery import discover
+from motor import CopMotor, DEFAULT_BAUD_RATE, SCALE_FACTOR, validate_args
+from oscillation import OscillationEngine, StrokeSchedule
+
+
+def discover_drives() -> Dict[str, int]:
+    # Port -> the baud rate the drive on it answered at
+    return {drive.port: drive.baud_rate for drive in discover()}
+
+
+class AxisProgram:
+    def __init__(self, velocity: float, acceleration: float, deceleration: float, desired_time: float,
+                 delta: float, phase: float = 0.0) -> None:
+        self.velocity = velocity
+        self.acceleration = acceleration
+        self.deceleration = deceleration
+        self.desired_time = desired_time
+        self.delta = delta
+        self.phase = phase  # fraction of this axis' oscillation period
+
+
+class Axis:
+    def __init__(self, port: str, dev: CopMotor) -> None:
+        self.port = port
+        self.dev = dev
+        self.report = None
+        self.error: Optional[Exception] = None
+
+
+class MultiAxisController:
+    # One thread and one CopMotor per port. A fault on any axis disables every drive.
+
+    def __init__(self, ports: List[str], lead: float = 0.1, baud_rates: Optional[Dict[str, int]] = None) -> None:
+        self._lead = lead  # time between the start barrier and the first stroke
+        self._stop = threading.Event()
+        self._start = None
+        baud_rates = baud_rates or {}
+        self.axes = {port: Axis(port, CopMotor(port, baud_rate=baud_rates.get(port, DEFAULT_BAUD_RATE)))
+                     for port in ports}
+        self.abort_latency: Optional[float] = None
+
+    def _set_start(self) -> None:
+        self._start = time.monotonic() + self._lead
+
+    def _run_axis(self, axis: Axis, program: AxisProgram, barrier: threading.Barrier) -> None:
+        try:
+            schedule = StrokeSchedule(program.delta, program.velocity, program.acceleration,
+                                      program.deceleration, program.desired_time, SCALE_FACTOR)
+            axis.dev.configure_profile(program.velocity, program.acceleration, program.deceleration)
+            axis.dev.enable_drive()
+            barrier.wait()
+            engine = OscillationEngine(axis.dev, schedule, stop=self._stop)
+            axis.report = engine.run(start=self._start + program.phase * schedule.period)
+        except threading.BrokenBarrierError:
+            pass
+        except Exception as e:
+            axis.error = e
+            logging.error(f" Axis {axis.port} failed: {e}")
+            barrier.abort()
+            self.abort()
+
+    def abort(self) -> None:
+        if self._stop.is_set():
+            return
+        self._stop.set()
+        started = time.monotonic()
+        self.disable_all(abort=True)
+        self.abort_latency = time.monotonic() - started
+        logging.info(f" All drives disabled {self.abort_latency * 1000:.1f} ms after fault")
+
+    def disable_all(self, abort: bool = False) -> None:
+        # Disable in parallel so the abort time is bounded by the slowest link, not the sum. With abort,
+        # CopMotor.abort() puts the disable on the wire without waiting for an exchange in flight.
+        def disable(axis: Axis) -> None:
+            try:
+                if abort:
+                    axis.dev.abort()
+                else:
+                    axis.dev.set("r0x24 0")
+            except Exception as e:
+                logging.error(f" Failed to disable drive on {axis.port}: {e}")
+
+        with ThreadPoolExecutor(max_workers=len(self.axes)) as pool:
+            list(pool.map(disable, self.axes.values()))
+
+    def run(self, programs: Dict[str, AxisProgram]) -> Dict[str, Axis]:
+        self._stop.clear()
+        barrier = threading.Barrier(len(programs), action=self._set_start)
+        threads = [threading.Thread(target=self._run_axis, args=(self.axes[port], program, barrier),
+                                    name=f'axis-{port}') for port, program in programs.items()]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.1)
+        except KeyboardInterrupt:
+            logging.info(" Interrupt detected. Disabling all drives...")
+            self.abort()
+            for thread in threads:
+                thread.join()
+        else:
+            if not self._stop.is_set():  # abort() has already disabled every drive
+                self._stop.set()
+                self.disable_all()
+        return self.axes
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Run oscillation programs on several drives at once')
+    parser.add_argument('-v', '--velocity', type=float, required=True, help='Motor VELOCITY (Units)')
+    parser.add_argument('-a', '--acceleration', type=float, required=True, help='Motor ACCELERATION (Units)')
+    parser.add_argument('-d', '--deceleration', type=float, required=True, help='Motor DECELERATION (Units)')
+    parser.add_argument('-t', '--desired-time', type=float, required=True, help='Motor RUN TIME (s)')
+    parser.add_argument('-dist', '--delta', type=float, required=True, help='Motor DELTA (Units)')
+    parser.add_argument('-p', '--ports', nargs='+', help='Serial ports (default: discover drives)')
+    parser.add_argument('--phases', type=float, nargs='+', help='Phase offset per port, as a fraction of the period')
+    args = parser.parse_args()
+
+    validate_args(args.velocity, args.acceleration, args.deceleration, args.desired_time, args.delta)
+    baud_rates = {} if args.ports else discover_drives()
+    ports = args.ports or list(baud_rates)
+    if not ports:
+        logging.error(" No drives found.")
+        raise SystemExit(1)
+    phases = args.phases or [0.0] * len(ports)
+    if len(phases) != len(ports):
+        logging.error(" Give one phase offset per port.")
+        raise SystemExit(1)
+
+    controller = MultiAxisController(ports, baud_rates=baud_rates)
+    programs = {port: AxisProgram(args.velocity, args.acceleration, args.deceleration, args.desired_time,
+                                  args.delta, phase) for port, phase in zip(ports, phases)}
+    for port, axis in controller.run(programs).items():
+        if axis.report is not None:
+            logging.info(f" Axis {port}:")
+            axis.report.log()
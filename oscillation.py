@@ -0,0 +1,109 @@
+import logging
+import math
+import threading
+import time
+from typing import List, Optional
+
+from motor import move_duration
+
+HEARTBEAT_INTERVAL = 0.1
+
+
+class StrokeSchedule:
+    # Every stroke of a run, planned up front from the profile registers the drive will receive.
+
+    def __init__(self, delta: float, velocity: float, acceleration: float, deceleration: float,
+                 desired_time: float, scale_factor: float = 0.00625, guard: float = 0.05) -> None:
+        self.delta = delta
+        self.stroke_time = move_duration(int(delta / scale_factor), int(velocity / scale_factor),
+                                         int(acceleration / scale_factor), int(deceleration / scale_factor))
+        if math.isinf(self.stroke_time):
+            raise ValueError(" VELOCITY, ACCELERATION and DECELERATION must be greater than 0 to oscillate")
+        # Guard time lets the previous move finish before the next relative move is issued.
+        self.interval = self.stroke_time + guard
+        self.period = 2 * self.interval
+
+        count = math.ceil(desired_time / self.interval) if self.interval > 0 else 0
+        self.offsets = [index * self.interval for index in range(count)]
+        self.directions = [1 if index % 2 == 0 else -1 for index in range(count)]
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+
+class OscillationReport:
+    def __init__(self, schedule: StrokeSchedule, planned: List[float], actual: List[float],
+                 cache_hits: int = 0, cache_misses: int = 0) -> None:
+        self.strokes = len(actual)
+        self.planned_period = schedule.period
+        drift = [a - p for a, p in zip(actual, planned)]
+        periods = [actual[i] - actual[i - 2] for i in range(2, len(actual), 2)]
+        self.achieved_period = sum(periods) / len(periods) if periods else float('nan')
+        self.period_jitter = max(abs(p - schedule.period) for p in periods) if periods else 0.0
+        self.final_drift = drift[-1] if drift else 0.0
+        self.max_drift = max(drift) if drift else 0.0
+        # Register cache lookups made by the stroke loop's writes. r0xCA changes sign on every stroke, so
+        # open-loop strokes are all misses: the cache does not reduce stroke-loop traffic.
+        self.cache_hits = cache_hits
+        self.cache_misses = cache_misses
+
+    def log(self) -> None:
+        logging.info(f" Strokes dispatched: {self.strokes}")
+        logging.info(f" Planned period: {self.planned_period:.4f} s, achieved period: {self.achieved_period:.4f} s")
+        logging.info(f" Worst period error: {self.period_jitter * 1000:.2f} ms")
+        logging.info(f" Phase drift: {self.final_drift * 1000:.2f} ms final, {self.max_drift * 1000:.2f} ms max")
+        logging.info(f" Register cache during the strokes: {self.cache_hits} hits, {self.cache_misses} misses")
+
+
+class OscillationEngine:
+    def __init__(self, dev, schedule: StrokeSchedule, spin: float = 0.002,
+                 stop: Optional[threading.Event] = None, heartbeat=None, corrector=None) -> None:
+        self._dev = dev
+        self._heartbeat = heartbeat
+        self._corrector = corrector  # correction.StrokeCorrector, or None for open-loop strokes
+        self._schedule = schedule
+        self._spin = spin
+        self._stop = stop if stop is not None else threading.Event()
+
+    def _sleep_until(self, deadline: float) -> bool:
+        # Coarse sleep, then spin for the last few milliseconds to beat OS timer resolution.
+        # With a heartbeat the sleep is chunked so a long gap between strokes still reports in.
+        while not self._stop.is_set():
+            if self._heartbeat is not None:
+                self._heartbeat(deadline)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return True
+            if remaining > self._spin:
+                coarse = remaining - self._spin
+                self._stop.wait(coarse if self._heartbeat is None else min(coarse, HEARTBEAT_INTERVAL))
+        return False
+
+    def run(self, start: Optional[float] = None) -> OscillationReport:
+        schedule = self._schedule
+        hits, misses = self._dev.cache_hits, self._dev.cache_misses
+        if self._corrector is not None and schedule.directions:
+            self._corrector.prepare(schedule.directions[0])
+        start = time.monotonic() if start is None else start
+        planned = []
+        actual = []
+        for index, (offset, direction) in enumerate(zip(schedule.offsets, schedule.directions)):
+            deadline = start + offset
+            if index > 0:
+                self._dev.wait_for_move(heartbeat=self._heartbeat)
+                if self._corrector is not None:
+                    self._corrector.prepare(direction, deadline)
+            if not self._sleep_until(deadline):
+                break
+            actual.append(time.monotonic() - start)
+            planned.append(offset)
+            if self._corrector is None:
+                self._dev.start_relative_move(schedule.delta, direction)
+            else:
+                self._corrector.stroke(direction)
+        if actual:
+            self._dev.wait_for_move(heartbeat=self._heartbeat)
+            if self._corrector is not None:
+                self._corrector.settled()
+        return OscillationReport(schedule, planned, actual, self._dev.cache_hits - hits,
+                                 self._dev.cache_misses - misses)
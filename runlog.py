@@ -0,0 +1,151 @@
+import argparse
+import os
+import struct
+import threading
+from typing import Dict, Iterable, Tuple
+
+import numpy as np
+
+MAGIC = b'COPRUN\x00\x00'
+VERSION = 1
+# magic, version, scale factor, velocity, acceleration, deceleration, delta, port
+HEADER = struct.Struct('<8sH6xddddd64s')
+HEADER_SIZE = 128
+# timestamp (s), raw register value (counts), register id
+RECORD = struct.Struct('<dqH')
+RECORD_DTYPE = np.dtype([('time', '<f8'), ('raw', '<i8'), ('register', '<u2')])
+
+REGISTER_NAMES = {
+    0x32: 'motor_position',
+    0x17: 'load_position',
+    0x35: 'following_error',
+    0xC9: 'trajectory_status',
+    0xA0: 'event_register',
+}
+
+
+class RunLogError(Exception):
+    pass
+
+
+class RunRecorder:
+    def __init__(self, path: str, scale_factor: float = 0.00625, velocity: float = 0.0,
+                 acceleration: float = 0.0, deceleration: float = 0.0, delta: float = 0.0,
+                 port: str = '', flush_bytes: int = 1 << 16) -> None:
+        self.path = path
+        self._flush_bytes = flush_bytes
+        self._buffer = bytearray()
+        self._lock = threading.Lock()
+        self.records = 0
+
+        new = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, 'ab')
+        if new:
+            header = HEADER.pack(MAGIC, VERSION, scale_factor, velocity, acceleration, deceleration,
+                                 delta, port.encode()[:64])
+            self._file.write(header.ljust(HEADER_SIZE, b'\0'))
+        else:
+            read_header(path)
+
+    def __enter__(self) -> 'RunRecorder':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def record(self, timestamp: float, register: int, raw: int) -> None:
+        with self._lock:
+            self._buffer += RECORD.pack(timestamp, raw, register)
+            self.records += 1
+            if len(self._buffer) >= self._flush_bytes:
+                self._flush()
+
+    def record_sample(self, timestamp: float, registers: Iterable[int], values: Iterable[int]) -> None:
+        with self._lock:
+            for register, raw in zip(registers, values):
+                self._buffer += RECORD.pack(timestamp, raw, register)
+                self.records += 1
+            if len(self._buffer) >= self._flush_bytes:
+                self._flush()
+
+    def _flush(self) -> None:
+        self._file.write(self._buffer)
+        self._buffer.clear()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush()
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            if self._file.closed:
+                return
+            self._flush()
+            self._file.close()
+
+
+def read_header(path: str) -> Dict[str, object]:
+    with open(path, 'rb') as f:
+        data = f.read(HEADER_SIZE)
+    if len(data) < HEADER_SIZE:
+        raise RunLogError(f" {path} is too short to be a run log")
+    magic, version, scale_factor, velocity, acceleration, deceleration, delta, port = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise RunLogError(f" {path} is not a run log")
+    if version != VERSION:
+        raise RunLogError(f" Unsupported run log version {version} in {path}")
+    return {
+        'scale_factor': scale_factor,
+        'velocity': velocity,
+        'acceleration': acceleration,
+        'deceleration': deceleration,
+        'delta': delta,
+        'port': port.rstrip(b'\0').decode(errors='replace'),
+    }
+
+
+class RunLog:
+    # Memory-mapped reader; opening does not read the records.
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.header = read_header(path)
+        self.scale_factor = self.header['scale_factor']
+        count = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        if count > 0:
+            self.records = np.memmap(path, dtype=RECORD_DTYPE, mode='r', offset=HEADER_SIZE, shape=(count,))
+        else:
+            self.records = np.zeros(0, dtype=RECORD_DTYPE)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def registers(self) -> np.ndarray:
+        return np.unique(self.records['register'])
+
+    def register(self, register: int) -> Tuple[np.ndarray, np.ndarray]:
+        mask = self.records['register'] == register
+        return self.records['time'][mask], self.records['raw'][mask]
+
+    def scaled(self, register: int) -> Tuple[np.ndarray, np.ndarray]:
+        times, raw = self.register(register)
+        return times, raw * self.scale_factor
+
+    def arrays(self) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        return {REGISTER_NAMES.get(int(register), f'0x{int(register):X}'): self.register(int(register))
+                for register in self.registers()}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summarize a binary run log')
+    parser.add_argument('path', help='Run log file')
+    args = parser.parse_args()
+
+    log = RunLog(args.path)
+    for key, value in log.header.items():
+        print(f" {key}: {value}")
+    print(f" records: {len(log)}")
+    for name, (times, raw) in log.arrays().items():
+        span = times[-1] - times[0] if len(times) > 1 else 0.0
+        print(f" {name}: {len(raw)} samples over {span:.3f} s")
@@ -0,0 +1,204 @@
+import argparse
+import logging
+import threading
+import time
+from typing import List, Optional
+
+from motor import EVENT_FAULT_MASK, CopMotor, CopMotorError
+
+WATCHED_REGISTERS = ('g r0x32', 'g r0x35', 'g r0xA0')
+HEARTBEAT_TIMEOUT = 1.0
+CHECK_INTERVAL = 0.1
+
+
+class SafetyWatchdog:
+    # Runs beside the control loop on its own thread. It checks drive faults, following error,
+    # the position envelope and the control loop's heartbeat, and on any violation disables the
+    # drive through CopMotor.abort, which does not wait for the control loop's exchange to finish.
+    # The control loop passes the time it next needs the link with each heartbeat; the watchdog
+    # only reads registers inside those quiet windows, so it never delays a stroke. A read that
+    # fails (a slow reply, say) only trips after max_read_failures in a row.
+
+    def __init__(self, dev, lower: float, upper: float, margin: Optional[float] = None,
+                 max_following_error: float = 5.0, heartbeat_timeout: float = HEARTBEAT_TIMEOUT,
+                 interval: float = CHECK_INTERVAL, sampler=None, read_drive: bool = True,
+                 max_read_failures: int = 2, on_trip=None) -> None:
+        self._dev = dev
+        self._scale_factor = dev._scale_factor
+        # Envelope in Units, widened by the margin on both sides
+        if margin is None:
+            margin = max(2.0, 0.1 * abs(upper - lower))
+        self.lower = min(lower, upper) - margin
+        self.upper = max(lower, upper) + margin
+        self.max_following_error = max_following_error
+        self.heartbeat_timeout = heartbeat_timeout
+        self.interval = interval
+        self._sampler = sampler
+        self._read_drive = read_drive  # False: heartbeat only
+        self.max_read_failures = max_read_failures
+        self._on_trip = on_trip  # called with the reason before the abort, e.g. to stop a control loop
+        self.read_failures = 0  # consecutive
+        self._last_heartbeat = time.monotonic()
+        self._quiet_until = None
+        self._exchange_time = interval
+        self._stop = threading.Event()
+        self._thread = None
+        self.tripped = threading.Event()
+        self.reason = None
+        self.detected_at = None
+        self.abort_latency = None
+        self.checks = 0
+        self.skipped = 0
+
+    def __enter__(self) -> 'SafetyWatchdog':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def heartbeat(self, quiet_until: Optional[float] = None) -> None:
+        self._last_heartbeat = time.monotonic()
+        self._quiet_until = quiet_until
+
+    @property
+    def last_heartbeat(self) -> float:
+        return self._last_heartbeat
+
+    def start(self) -> None:
+        self._stop.clear()
+        self.heartbeat()
+        self._thread = threading.Thread(target=self._run, name='safety-watchdog', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _sample(self):
+        # Prefer the telemetry sampler's latest row when it is fresh, so the watchdog adds no traffic.
+        if self._sampler is not None:
+            rows = self._sampler.snapshot(1)
+            if len(rows) and time.monotonic() - rows[-1][0] < 2 * self.interval:
+                _, position, _, following_error, _, event = rows[-1]
+                return int(position), int(following_error), int(event)
+        if not self._read_drive:
+            return None
+        quiet_until = self._quiet_until
+        started = time.monotonic()
+        if quiet_until is None or started + self._exchange_time > quiet_until:
+            return None
+        values = self._dev.poll(list(WATCHED_REGISTERS), 0.0, quiet_until - started)
+        if values is None:
+            return None
+        # Leave twice the slowest exchange seen as headroom before the control loop's next command
+        self._exchange_time = max(self._exchange_time, 2 * (time.monotonic() - started))
+        return tuple(int(value) for value in values)
+
+    def check(self) -> Optional[str]:
+        silent = time.monotonic() - self._last_heartbeat
+        if silent > self.heartbeat_timeout:
+            return f"Control loop silent for {silent:.3f} seconds"
+        try:
+            sample = self._sample()
+        except Exception as e:
+            self.read_failures += 1
+            if self.read_failures >= self.max_read_failures:
+                return f"Watchdog could not read the drive {self.read_failures} times in a row: {e}"
+            logging.warning(f" Watchdog could not read the drive, will retry: {e}")
+            self.skipped += 1
+            return None
+        if sample is None:
+            # The control loop is using the link; its heartbeat decides whether it is stuck.
+            self.skipped += 1
+            return None
+        self.read_failures = 0
+        self.checks += 1
+        position, following_error, event = sample
+        if event & EVENT_FAULT_MASK:
+            return f"Drive fault. Event register: {event:x}"
+        following_error *= self._scale_factor
+        if abs(following_error) > self.max_following_error:
+            return f"Following error {following_error:.3f} Units exceeds {self.max_following_error:.3f}"
+        position *= self._scale_factor
+        if not self.lower <= position <= self.upper:
+            return f"Position {position:.3f} Units outside {self.lower:.3f} to {self.upper:.3f}"
+        return None
+
+    def trip(self, reason: str) -> None:
+        self.detected_at = time.monotonic()
+        self.reason = reason
+        self.tripped.set()
+        if self._on_trip is not None:
+            self._on_trip(reason)
+        logging.error(f" Safety watchdog tripped: {reason}")
+        try:
+            self.abort_latency = self._dev.abort()
+        except Exception as e:
+            logging.error(f" Error occurred while aborting: {e}")
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            reason = self.check()
+            if reason is not None:
+                self.trip(reason)
+                return
+
+
+def measure_abort_latency(baud_rate: int = 9600, trials: int = 20) -> List[float]:
+    # After a normal move, the stand-in drive stops replying to a control loop exchange already
+    # holding the link, so the control thread blocks in a read (with the port's usual timeout) and
+    # the watchdog cannot read the drive either: only the silent heartbeat can trip it, and the abort
+    # has to release the blocked read. Each latency runs from the control loop's last heartbeat to
+    # the drive seeing r0x24 0, so it includes the detection time (heartbeat_timeout + interval).
+    from simulator import CopleySimulator
+
+    def control(dev: CopMotor, watchdog: SafetyWatchdog, sim: CopleySimulator) -> None:
+        try:
+            dev.wait_for_move(heartbeat=watchdog.heartbeat)
+            watchdog.heartbeat()
+            with dev._lock:
+                sim.mute = True
+                dev.pipeline(['g r0xC9', 'g r0xA0'])
+        except CopMotorError:
+            pass
+
+    latencies = []
+    for _ in range(trials):
+        with CopleySimulator(baud_rate=baud_rate) as sim:
+            dev = CopMotor(sim.port, baud_rate=sim.baud_rate)  # the simulator ignores commands sent at any other rate
+            dev.configure_profile(800, 100, 100)
+            dev.enable_drive()
+            origin = dev.get_motor_position()
+            watchdog = SafetyWatchdog(dev, origin - 50, origin + 50)
+            with watchdog:
+                dev.start_relative_move(10)
+                thread = threading.Thread(target=control, args=(dev, watchdog, sim), daemon=True)
+                thread.start()
+                if not watchdog.tripped.wait(30.0):
+                    raise CopMotorError(" Watchdog did not trip on a silent control loop")
+                while sim._registers[0x24] != 0:
+                    time.sleep(0.0001)
+                latencies.append(time.monotonic() - watchdog.last_heartbeat)
+            if not watchdog.reason.startswith("Control loop silent"):
+                raise CopMotorError(f" Watchdog tripped on '{watchdog.reason}', not the silent control loop")
+            thread.join(1.0)
+            if thread.is_alive():
+                raise CopMotorError(" The abort did not release the control loop's blocked read")
+            dev._dev.close()
+    return latencies
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+
+    parser = argparse.ArgumentParser(description='Measure watchdog abort latency against a simulated drive')
+    parser.add_argument('-n', '--trials', type=int, default=20, help='Number of aborts to measure')
+    parser.add_argument('-b', '--baud-rate', type=int, default=9600, help='Simulated drive baud rate')
+    args = parser.parse_args()
+
+    latencies = sorted(measure_abort_latency(args.baud_rate, args.trials))
+    print(f" Abort latency over {args.trials} trials at {args.baud_rate} baud: "
+          f"median {latencies[len(latencies) // 2] * 1000:.3f} ms, worst {latencies[-1] * 1000:.3f} ms")
@@ -0,0 +1,130 @@
+import logging
+import threading
+import time
+from typing import Dict
+
+from motor import CopMotor, CopMotorError, SCALE_FACTOR, check_args
+from oscillation import OscillationEngine, StrokeSchedule
+from safety import SafetyWatchdog
+
+RUN_FIELDS = ('velocity', 'acceleration', 'deceleration', 'desired_time', 'delta')
+
+
+class MotorDaemon:
+    # Owns the CopMotor connection between runs. The drive stays enabled while idle and the
+    # profile registers are only rewritten when they change, so a run starts with its first stroke.
+    # Every run is guarded by a SafetyWatchdog; the idle drive is left to the idle_disable timeout.
+
+    def __init__(self, port: str, idle_disable: float = 300.0, upgrade_baud_rate: bool = False) -> None:
+        self.dev = CopMotor(port, upgrade_baud_rate)
+        self._upgrade_baud_rate = upgrade_baud_rate
+        self._idle_disable = idle_disable
+        self._enabled = False
+        self._run_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._closed = threading.Event()
+        self._last_activity = time.monotonic()
+        self.runs = 0
+
+    def run(self, params: Dict[str, float]) -> Dict[str, object]:
+        received = time.monotonic()
+        try:
+            values = [float(params[field]) for field in RUN_FIELDS]
+            check_args(*values)
+        except (KeyError, TypeError, ValueError, AssertionError) as e:
+            return {'ok': False, 'error': f"Invalid run request: {e}"}
+        velocity, acceleration, deceleration, desired_time, delta = values
+
+        if not self._run_lock.acquire(blocking=False):
+            return {'ok': False, 'error': "A run is already in progress"}
+        try:
+            schedule = StrokeSchedule(delta, velocity, acceleration, deceleration, desired_time, SCALE_FACTOR)
+            if not self._enabled and self._upgrade_baud_rate:
+                # Disabling the drive (idle timeout, failed run) restored the default rate.
+                self.dev.upgrade_baud_rate()
+            self.dev.configure_profile(velocity, acceleration, deceleration)
+            if not self._enabled:
+                self.dev.enable_drive()
+                self._enabled = True
+            origin = self.dev.get_motor_position()
+            if origin is None:
+                raise CopMotorError(" Failed to get motor position.")
+            watchdog = SafetyWatchdog(self.dev, origin, origin + delta, on_trip=lambda reason: self._stop.set())
+            self._stop.clear()
+            start = time.monotonic()
+            with watchdog:
+                try:
+                    report = OscillationEngine(self.dev, schedule, stop=self._stop,
+                                               heartbeat=watchdog.heartbeat).run(start)
+                    if report.strokes % 2 and not watchdog.tripped.is_set():
+                        # Return to the starting position so the next run begins in the same place.
+                        self.dev.start_relative_move(delta, -1)
+                        self.dev.wait_for_move(heartbeat=watchdog.heartbeat)
+                except CopMotorError:
+                    # An abort cancels the control loop's exchange in flight
+                    if not watchdog.tripped.is_set():
+                        raise
+            if watchdog.tripped.is_set():
+                logging.error(f" Safety watchdog disabled the drive: {watchdog.reason}")
+                self.disable()
+                return {'ok': False, 'error': f"Safety watchdog disabled the drive: {watchdog.reason}"}
+            self.runs += 1
+            return {
+                'ok': True,
+                'startup_s': start - received,
+                'strokes': report.strokes,
+                'planned_period_s': report.planned_period,
+                'achieved_period_s': report.achieved_period,
+                'period_jitter_s': report.period_jitter,
+                'final_drift_s': report.final_drift,
+                'max_drift_s': report.max_drift,
+                'stopped': self._stop.is_set(),
+            }
+        except Exception as e:
+            logging.error(f" Run failed: {e}")
+            self.disable()
+            return {'ok': False, 'error': str(e)}
+        finally:
+            self._last_activity = time.monotonic()
+            self._run_lock.release()
+
+    def stop(self) -> Dict[str, object]:
+        self._stop.set()
+        return {'ok': True}
+
+    def status(self) -> Dict[str, object]:
+        return {
+            'ok': True,
+            'enabled': self._enabled,
+            'running': self._run_lock.locked(),
+            'runs': self.runs,
+            'idle_s': time.monotonic() - self._last_activity,
+            'cache': {'hits': self.dev.cache_hits, 'misses': self.dev.cache_misses},
+        }
+
+    def disable(self) -> None:
+        if not self._enabled:
+            return
+        try:
+            self.dev.disable_drive()
+        except Exception as e:
+            logging.error(f" Error occurred while disabling drive: {e}")
+        self._enabled = False
+
+    def close(self) -> None:
+        self._stop.set()
+        self._closed.set()
+        with self._run_lock:
+            self.disable()
+            self.dev.close()
+
+    def watch_idle(self) -> None:
+        # Do not leave the drive energized indefinitely between trials.
+        while not self._closed.wait(1.0):
+            idle = time.monotonic() - self._last_activity
+            if self._enabled and idle > self._idle_disable and self._run_lock.acquire(blocking=False):
+                try:
+                    logging.info(f" Idle for {idle:.0f} seconds, disabling drive")
+                    self.disable()
+                finally:
+                    self._run_lock.release()
@@ -0,0 +1,431 @@
+import argparse
+import logging
+import math
+import os
+import select
+import termios
+import threading
+import time
+import tty
+from typing import Optional
+
+import binary_protocol
+
+# Copley register units: velocity 0.1 counts/s, acceleration/deceleration 10 counts/s^2
+VELOCITY_UNIT = 0.1
+ACCELERATION_UNIT = 10.0
+
+# Event status register (0xA0) bits
+EVENT_SHORT_CIRCUIT = 1 << 0
+EVENT_OVER_TEMPERATURE = 1 << 1
+EVENT_OVER_VOLTAGE = 1 << 2
+EVENT_UNDER_VOLTAGE = 1 << 3
+EVENT_SOFTWARE_DISABLE = 1 << 12
+EVENT_DRIVE_FAULT = 1 << 22
+EVENT_IN_MOTION = 1 << 27
+
+# Trajectory status register (0xC9) bits
+TRAJECTORY_ABORTED = 1 << 13
+TRAJECTORY_IN_MOTION = 1 << 15
+
+# Trajectory profile type (0xC8): absolute trapezoidal unless this bit is set
+PROFILE_RELATIVE = 1 << 8
+
+# ASCII error codes
+ERROR_UNKNOWN_COMMAND = 3
+ERROR_NOT_ENOUGH_DATA = 4
+ERROR_UNKNOWN_PARAMETER = 9
+ERROR_VALUE_RANGE = 10
+ERROR_READ_ONLY = 11
+ERROR_ILLEGAL_VELOCITY = 19
+ERROR_ILLEGAL_ACCELERATION = 20
+ERROR_ILLEGAL_DECELERATION = 21
+ERROR_PARSE = 33
+
+READ_ONLY_REGISTERS = (0x32, 0x17, 0x35, 0x80, 0x81, 0xA0, 0xC9)
+MODEL = 'ACJ-090-09'
+BAUD_RATES = (9600, 14400, 19200, 28800, 38400, 56000, 57600, 115200)
+
+
+class TrapezoidMove:
+    # Piecewise constant-acceleration profile starting from an arbitrary position and velocity.
+
+    def __init__(self, start_time: float, position: float, velocity: float, target: float,
+                 max_velocity: float, acceleration: float, deceleration: float) -> None:
+        self.start_time = start_time
+        self.start_position = position
+        self.start_velocity = velocity
+        self.target = target
+        self.segments = []
+
+        distance = target - position
+        # Moving away from the target, or too fast to stop before it: come to rest first.
+        if velocity != 0 and (velocity * distance < 0 or velocity * velocity / (2 * deceleration) > abs(distance)):
+            position, velocity = self._add(position, velocity, abs(velocity) / deceleration, -math.copysign(deceleration, velocity))
+            distance = target - position
+        if distance == 0 and velocity == 0:
+            return
+        direction = math.copysign(1.0, distance)
+        speed = abs(velocity)
+        if speed > max_velocity:
+            position, velocity = self._add(position, velocity, (speed - max_velocity) / deceleration, -direction * deceleration)
+            speed = max_velocity
+            distance = target - position
+
+        remaining = abs(distance)
+        peak = math.sqrt((remaining + speed * speed / (2 * acceleration)) / (1 / (2 * acceleration) + 1 / (2 * deceleration)))
+        peak = max(min(peak, max_velocity), speed)
+        accel_distance = (peak * peak - speed * speed) / (2 * acceleration)
+        decel_distance = peak * peak / (2 * deceleration)
+        cruise_distance = max(remaining - accel_distance - decel_distance, 0.0)
+
+        position, velocity = self._add(position, velocity, (peak - speed) / acceleration, direction * acceleration)
+        position, velocity = self._add(position, velocity, cruise_distance / peak if peak > 0 else 0.0, 0.0)
+        self._add(position, velocity, peak / deceleration, -direction * deceleration)
+
+    def _add(self, position: float, velocity: float, duration: float, acceleration: float):
+        if duration > 0:
+            self.segments.append((duration, acceleration))
+            position += velocity * duration + 0.5 * acceleration * duration * duration
+            velocity += acceleration * duration
+        return position, velocity
+
+    @property
+    def duration(self) -> float:
+        return sum(duration for duration, _ in self.segments)
+
+    def state(self, now: float):
+        elapsed = now - self.start_time
+        position = self.start_position
+        velocity = self.start_velocity
+        for duration, acceleration in self.segments:
+            step = min(elapsed, duration)
+            position += velocity * step + 0.5 * acceleration * step * step
+            velocity += acceleration * step
+            elapsed -= step
+            if elapsed <= 0:
+                return position, velocity, acceleration, True
+        return self.target, 0.0, 0.0, False
+
+
+class CopleySimulator:
+    # Copley ASCII drive stand-in served on the master side of a pseudo-terminal.
+
+    def __init__(self, baud_rate: int = 9600, reply_delay: float = 0.0005,
+                 following_lag: float = 0.002, position: int = 0, serial_number: int = 1000001,
+                 backlash: int = 0, load_creep: float = 0.0) -> None:
+        self.baud_rate = baud_rate
+        self.serial_number = serial_number
+        # Load side of the transmission: dead band on reversal (counts) and steady slip (counts/s)
+        self.backlash = backlash
+        self.load_creep = load_creep
+        self.reply_delay = reply_delay
+        self.following_lag = following_lag
+        self.commands = 0
+        self.mute = False  # keep executing commands but stop replying, like a broken return line
+
+        self._registers = {
+            0x24: 0,     # desired state
+            0x90: baud_rate,  # serial baud rate
+            0xC4: 0,
+            0xC8: 0,     # profile type, absolute or relative
+            0xCA: 0,     # move distance
+            0xCB: 0,     # profile velocity
+            0xCC: 0,     # profile acceleration
+            0xCD: 0,     # profile deceleration
+        }
+        self._position = float(position)
+        self._load = float(position)
+        self._load_time = time.monotonic()
+        self._slip = 0.0
+        self._move: Optional[TrapezoidMove] = None
+        self._faults = 0
+        self._aborted = False
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._rx_free_at = 0.0
+        self._tx_free_at = 0.0
+        self._pending_baud_rate = None
+
+        self._master, self._slave = os.openpty()
+        tty.setraw(self._slave)
+        self._port = os.ttyname(self._slave)
+
+    @property
+    def port(self) -> str:
+        return self._port
+
+    def __enter__(self) -> 'CopleySimulator':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._serve, name='copley-simulator', daemon=True)
+        self._thread.start()
+        logging.info(f" Simulated drive listening on {self._port} ({self.baud_rate} baud)")
+
+    def close(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for fd in (self._master, self._slave):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    def inject_fault(self, bits: int = EVENT_DRIVE_FAULT) -> None:
+        with self._lock:
+            now = time.monotonic()
+            self._settle(now)
+            self._position = self._motion(now)[0]
+            self._move = None
+            self._faults |= bits
+
+    def clear_faults(self) -> None:
+        with self._lock:
+            self._faults = 0
+
+    def _bit_time(self) -> float:
+        # 8N1 framing: ten bit times per byte
+        return 10.0 / self.baud_rate
+
+    def _serve(self) -> None:
+        buffer = b''
+        while not self._stop.is_set():
+            ready, _, _ = select.select([self._master], [], [], 0.01)
+            if not ready:
+                continue
+            try:
+                chunk = os.read(self._master, 4096)
+            except OSError:
+                break
+            now = time.monotonic()
+            self._rx_free_at = max(now, self._rx_free_at)
+            buffer += chunk
+            while True:
+                message, buffer = self._next_message(buffer)
+                if message is None:
+                    break
+                self._rx_free_at += len(message) * self._bit_time()
+                self._wait_until(self._rx_free_at)
+                if not self._host_baud_rate_matches():
+                    # At the wrong baud rate the drive only sees framing errors and stays silent.
+                    continue
+                reply = self._reply(message)
+                if reply is None:
+                    continue
+                self._tx_free_at = max(self._rx_free_at + self.reply_delay, self._tx_free_at)
+                self._tx_free_at += len(reply) * self._bit_time()
+                self._wait_until(self._tx_free_at)
+                if self.mute:
+                    continue
+                try:
+                    os.write(self._master, reply)
+                except OSError:
+                    return
+                if self._pending_baud_rate is not None:
+                    # The drive acknowledges at the old rate, then switches.
+                    self.baud_rate, self._pending_baud_rate = self._pending_baud_rate, None
+
+    @staticmethod
+    def _is_binary(message: bytes) -> bool:
+        # Binary frames start with the node ID byte, ASCII commands with printable text,
+        # so the drive tells the two protocols apart command by command.
+        return message[0] < 0x20 and message[:1] not in (b'\r', b'\n')
+
+    def _next_message(self, buffer: bytes):
+        if not buffer:
+            return None, buffer
+        if self._is_binary(buffer):
+            length = binary_protocol.frame_length(buffer)
+            if length is None or len(buffer) < length:
+                return None, buffer
+            return buffer[:length], buffer[length:]
+        if b'\r' not in buffer:
+            return None, buffer
+        line, rest = buffer.split(b'\r', 1)
+        return line + b'\r', rest
+
+    def _reply(self, message: bytes) -> Optional[bytes]:
+        if self._is_binary(message):
+            if binary_protocol.checksum(message):
+                return None  # a corrupt frame gets no reply
+            try:
+                command = binary_protocol.decode_command(message)
+            except ValueError:
+                return binary_protocol.frame(ERROR_UNKNOWN_COMMAND)
+            return binary_protocol.encode_reply(command, self.handle(command))
+        return self.handle(message[:-1].decode(errors='replace').strip()).encode() + b'\r'
+
+    def _host_baud_rate_matches(self) -> bool:
+        # The host's port settings are visible on the pty; rates termios has no constant for cannot be checked.
+        speed = termios.tcgetattr(self._slave)[5]
+        known = {getattr(termios, f'B{rate}'): rate for rate in BAUD_RATES if hasattr(termios, f'B{rate}')}
+        return speed not in known or known[speed] == self.baud_rate
+
+    def _wait_until(self, deadline: float) -> None:
+        delay = deadline - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def handle(self, line: str) -> str:
+        with self._lock:
+            self.commands += 1
+            parts = line.split()
+            if not parts:
+                return f'e {ERROR_PARSE}'
+            try:
+                if parts[0] == 's':
+                    if len(parts) < 3:
+                        return f'e {ERROR_NOT_ENOUGH_DATA}'
+                    return self._set(self._register(parts[1]), int(parts[2], 0))
+                if parts[0] == 'g':
+                    if len(parts) < 2:
+                        return f'e {ERROR_NOT_ENOUGH_DATA}'
+                    return self._get(self._register(parts[1]))
+                if parts[0] == 't':
+                    if len(parts) < 2:
+                        return f'e {ERROR_NOT_ENOUGH_DATA}'
+                    return self._trajectory(int(parts[1], 0))
+            except ValueError:
+                return f'e {ERROR_PARSE}'
+            return f'e {ERROR_UNKNOWN_COMMAND}'
+
+    def _register(self, token: str) -> int:
+        if not token.lower().startswith('r'):
+            raise ValueError(token)
+        return int(token[1:], 0)
+
+    def _set(self, register: int, value: int) -> str:
+        if register in READ_ONLY_REGISTERS:
+            return f'e {ERROR_READ_ONLY}'
+        if register not in self._registers:
+            return f'e {ERROR_UNKNOWN_PARAMETER}'
+        if register == 0x90:
+            if value not in BAUD_RATES:
+                return f'e {ERROR_VALUE_RANGE}'
+            self._pending_baud_rate = value
+        self._registers[register] = value
+        if register == 0x24 and value == 0:
+            now = time.monotonic()
+            self._settle(now)
+            self._position = self._motion(now)[0]
+            self._move = None
+        return 'ok'
+
+    def _get(self, register: int) -> str:
+        now = time.monotonic()
+        self._settle(now)
+        position, velocity, acceleration, moving = self._motion(now)
+        if register == 0x32:
+            return f'v {int(round(position))}'
+        if register == 0x17:
+            return f'v {int(round(self._load_position(now, position)))}'
+        if register == 0x35:
+            return f'v {int(round(velocity * self.following_lag))}'
+        if register == 0x80:
+            return f'v {MODEL}'
+        if register == 0x81:
+            return f'v {self.serial_number}'
+        if register == 0xA0:
+            return f'v {self._event_status(moving)}'
+        if register == 0xC9:
+            status = TRAJECTORY_IN_MOTION if moving else 0
+            if self._aborted:
+                status |= TRAJECTORY_ABORTED
+            return f'v {status}'
+        if register in self._registers:
+            return f'v {self._registers[register]}'
+        return f'e {ERROR_UNKNOWN_PARAMETER}'
+
+    def _trajectory(self, value: int) -> str:
+        now = time.monotonic()
+        self._settle(now)
+        position, velocity, _, _ = self._motion(now)
+        if value == 0:
+            if self._move is not None:
+                deceleration = self._registers[0xCD] * ACCELERATION_UNIT
+                stop = position + velocity * abs(velocity) / (2 * deceleration) if deceleration > 0 else position
+                self._move = TrapezoidMove(now, position, velocity, stop, abs(velocity), deceleration or 1.0, deceleration or 1.0)
+                self._aborted = True
+            return 'ok'
+        max_velocity = self._registers[0xCB] * VELOCITY_UNIT
+        acceleration = self._registers[0xCC] * ACCELERATION_UNIT
+        deceleration = self._registers[0xCD] * ACCELERATION_UNIT
+        if max_velocity <= 0:
+            return f'e {ERROR_ILLEGAL_VELOCITY}'
+        if acceleration <= 0:
+            return f'e {ERROR_ILLEGAL_ACCELERATION}'
+        if deceleration <= 0:
+            return f'e {ERROR_ILLEGAL_DECELERATION}'
+        self._aborted = False
+        if self._registers[0x24] == 0 or self._faults:
+            return 'ok'
+        if self._registers[0xC8] & PROFILE_RELATIVE:
+            # Relative moves are taken from the instantaneous commanded position.
+            target = position + self._registers[0xCA]
+        else:
+            target = self._registers[0xCA]
+        self._move = TrapezoidMove(now, position, velocity, target, max_velocity, acceleration, deceleration)
+        return 'ok'
+
+    def _settle(self, now: float) -> None:
+        if self._move is not None and now - self._move.start_time >= self._move.duration:
+            self._position = self._move.target
+            self._move = None
+
+    def _motion(self, now: float):
+        if self._move is None:
+            return self._position, 0.0, 0.0, False
+        return self._move.state(now)
+
+    def _load_position(self, now: float, position: float) -> float:
+        # The load only follows the motor once the motor has taken up the backlash.
+        half = self.backlash / 2
+        if position - self._load > half:
+            self._load = position - half
+        elif self._load - position > half:
+            self._load = position + half
+        self._slip += self.load_creep * (now - self._load_time)
+        self._load_time = now
+        return self._load + self._slip
+
+    def _event_status(self, moving: bool) -> int:
+        status = self._faults
+        if self._faults:
+            status |= EVENT_DRIVE_FAULT
+        if self._registers[0x24] == 0:
+            status |= EVENT_SOFTWARE_DISABLE
+        if moving:
+            status |= EVENT_IN_MOTION
+        return status
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Simulated Copley drive on a pseudo-terminal')
+    parser.add_argument('-b', '--baud-rate', type=int, default=9600, help='Simulated serial baud rate')
+    parser.add_argument('-r', '--reply-delay', type=float, default=0.0005, help='Drive processing delay per command (s)')
+    parser.add_argument('-n', '--serial-number', type=int, default=1000001, help='Drive serial number (0x81)')
+    parser.add_argument('--backlash', type=int, default=0, help='Load backlash (counts)')
+    parser.add_argument('--load-creep', type=float, default=0.0, help='Load slip relative to the motor (counts/s)')
+    args = parser.parse_args()
+
+    sim = CopleySimulator(baud_rate=args.baud_rate, reply_delay=args.reply_delay, serial_number=args.serial_number,
+                          backlash=args.backlash, load_creep=args.load_creep)
+    sim.start()
+    print(f" Simulated drive port: {sim.port}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        logging.info(" Interrupt detected. Stopping simulated drive.")
+    finally:
+        sim.close()
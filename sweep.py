@@ -0,0 +1,104 @@
+import argparse
+import itertools
+import json
+import logging
+import sys
+import time
+from typing import Dict, List
+
+from motor import PORT, check_args
+from session import RUN_FIELDS, MotorDaemon
+
+# Profile registers vary slowest so consecutive trials rewrite as few registers as possible.
+GRID_ORDER = ('velocity', 'acceleration', 'deceleration', 'delta', 'desired_time')
+
+
+def load_spec(path: str) -> List[Dict[str, float]]:
+    # {"grid": {"velocity": [100, 200], ...}} expands to every combination;
+    # {"trials": [{"velocity": 100, ...}, ...]} runs the listed parameter sets.
+    # Either form may add "defaults" for fields that do not vary and "repeat" to run each trial n times.
+    with open(path) as f:
+        spec = json.load(f)
+    defaults = spec.get('defaults', {})
+    if 'grid' in spec:
+        grid = dict(defaults, **spec['grid'])
+        axes = [grid[field] if isinstance(grid.get(field), list) else [grid.get(field)] for field in GRID_ORDER]
+        trials = [dict(zip(GRID_ORDER, values)) for values in itertools.product(*axes)]
+    else:
+        trials = [dict(defaults, **trial) for trial in spec['trials']]
+    repeat = int(spec.get('repeat', 1))
+    return [dict(trial) for trial in trials for _ in range(repeat)]
+
+
+def validate_trials(trials: List[Dict[str, float]]) -> List[str]:
+    errors = []
+    for index, trial in enumerate(trials):
+        try:
+            check_args(*(float(trial[field]) for field in RUN_FIELDS))
+        except (KeyError, TypeError, ValueError, AssertionError) as e:
+            errors.append(f"Trial {index} {trial}: {e}")
+    return errors
+
+
+def run_sweep(trials: List[Dict[str, float]], run_trial, output=None) -> List[Dict[str, object]]:
+    summaries = []
+    started = time.monotonic()
+    for index, trial in enumerate(trials):
+        trial_started = time.monotonic()
+        result = run_trial(trial)
+        summary = dict(trial, trial=index, wall_s=time.monotonic() - trial_started, **result)
+        summaries.append(summary)
+        if output is not None:
+            output.write(json.dumps(summary) + '\n')
+            output.flush()
+        if result.get('ok'):
+            logging.info(f" Trial {index + 1}/{len(trials)}: {result['strokes']} strokes, "
+                         f"period {result['achieved_period_s']:.4f} s, startup {result['startup_s'] * 1000:.2f} ms")
+        else:
+            logging.error(f" Trial {index + 1}/{len(trials)} failed: {result.get('error')}")
+            break
+    elapsed = time.monotonic() - started
+    if elapsed > 0:
+        logging.info(f" {len(summaries)} trials in {elapsed:.1f} s ({len(summaries) / elapsed * 3600:.1f} trials/hour)")
+    return summaries
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Run a sweep of oscillation trials on one drive connection')
+    parser.add_argument('spec', help='Sweep spec JSON file')
+    parser.add_argument('-o', '--output', help='Write one JSON summary line per trial to this file')
+    parser.add_argument('-p', '--port', default=PORT, help='Serial port')
+    parser.add_argument('-s', '--socket', help='Run the trials through a motord.py daemon instead')
+    args = parser.parse_args()
+
+    trials = load_spec(args.spec)
+    errors = validate_trials(trials)
+    if errors:
+        for error in errors:
+            logging.error(f" {error}")
+        sys.exit(1)
+    logging.info(f" {len(trials)} trials validated")
+
+    output = open(args.output, 'a') if args.output else None
+    session = None
+    try:
+        if args.socket:
+            # Unix sockets only; the local mode has to import on Windows too.
+            from motord import request
+            run_trial = lambda trial: request(args.socket, dict(trial, cmd='run'))
+        else:
+            session = MotorDaemon(args.port)
+            run_trial = session.run
+        run_sweep(trials, run_trial, output)
+    except KeyboardInterrupt:
+        logging.info(" Interrupt detected. Stopping sweep...")
+        if args.socket:
+            from motord import request
+            request(args.socket, {'cmd': 'stop'})
+    finally:
+        if session is not None:
+            session.close()
+        if output is not None:
+            output.close()
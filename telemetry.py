@@ -0,0 +1,117 @@
+import logging
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+
+TELEMETRY_REGISTERS = (0x32, 0x17, 0x35, 0xC9, 0xA0)
+COLUMNS = ('time', 'motor_position', 'load_position', 'following_error', 'trajectory_status', 'event_register')
+
+
+class TelemetryBuffer:
+    # Preallocated ring buffer. Every row is written twice (at i and i + size) so the latest N rows
+    # are always one contiguous slice and can be handed out without copying. The ring holds headroom
+    # rows beyond capacity, so a view of up to capacity rows outlives that many further appends.
+
+    def __init__(self, capacity: int, headroom: Optional[int] = None) -> None:
+        self.capacity = capacity
+        self.headroom = capacity if headroom is None else headroom
+        self._size = capacity + self.headroom
+        self._data = np.zeros((2 * self._size, len(COLUMNS)), dtype=np.float64)
+        self._count = 0
+
+    def __len__(self) -> int:
+        return min(self._count, self.capacity)
+
+    @property
+    def total(self) -> int:
+        return self._count
+
+    def append(self, row) -> None:
+        index = self._count % self._size
+        self._data[index] = row
+        self._data[index + self._size] = row
+        self._count += 1
+
+    def latest(self, n: Optional[int] = None) -> np.ndarray:
+        # Read-only view of the newest rows (at most capacity), oldest first. Its oldest row is
+        # overwritten after size - n + 1 further appends, so it stays valid for at least `headroom`
+        # appends; copy it to keep it longer.
+        count = self._count
+        available = min(count, self.capacity)
+        n = available if n is None else min(n, available)
+        end = count % self._size + self._size
+        view = self._data[end - n:end]
+        view.flags.writeable = False
+        return view
+
+
+class TelemetrySampler:
+    def __init__(self, dev, rate: float = 10.0, capacity: int = 36000, recorder=None) -> None:
+        self._dev = dev
+        self.rate = rate
+        self.buffer = TelemetryBuffer(capacity)
+        self.errors = 0
+        self._recorder = recorder  # optional runlog.RunRecorder
+        self._commands = [f'g r0x{register:X}' for register in TELEMETRY_REGISTERS]
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = None
+        self._stopped = None
+
+    def __enter__(self) -> 'TelemetrySampler':
+        self.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+    def start(self) -> None:
+        self._stop.clear()
+        self._started = time.monotonic()
+        self._stopped = None
+        self._thread = threading.Thread(target=self._run, name='telemetry', daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self._stopped = time.monotonic()
+
+    @property
+    def achieved_rate(self) -> float:
+        if self._started is None:
+            return 0.0
+        elapsed = (self._stopped or time.monotonic()) - self._started
+        return self.buffer.total / elapsed if elapsed > 0 else 0.0
+
+    def snapshot(self, n: Optional[int] = None) -> np.ndarray:
+        return self.buffer.latest(n)
+
+    def _run(self) -> None:
+        interval = 1.0 / self.rate
+        deadline = time.monotonic()
+        while not self._stop.is_set():
+            before = time.monotonic()
+            try:
+                values = self._dev.pipeline(self._commands)
+            except Exception as e:
+                self.errors += 1
+                logging.error(f" Telemetry sample failed: {e}")
+            else:
+                # Timestamp at the middle of the exchange
+                timestamp = (before + time.monotonic()) / 2
+                row = [timestamp] + [int(value) for value in values]
+                self.buffer.append(row)
+                if self._recorder is not None:
+                    self._recorder.record_sample(timestamp, TELEMETRY_REGISTERS, row[1:])
+            deadline += interval
+            delay = deadline - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                # Running behind the target rate; do not try to catch up with a burst.
+                deadline = time.monotonic()
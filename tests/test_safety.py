@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+pytest.importorskip('termios', reason='simulator.py needs a pseudo-terminal (Linux/macOS)')
+
+from motor import CopMotor  # noqa: E402
+from safety import CHECK_INTERVAL, HEARTBEAT_TIMEOUT, SafetyWatchdog, measure_abort_latency  # noqa: E402
+from simulator import CopleySimulator  # noqa: E402
+
+
+def test_abort_latency_at_9600_baud():
+    # Worst case over a few aborts with the control loop blocked in a read on a silent drive, from its
+    # last heartbeat to the drive seeing the disable. measure_abort_latency raises if anything but the
+    # silent heartbeat tripped the watchdog, or if the abort left the read blocked.
+    latencies = measure_abort_latency(baud_rate=9600, trials=3)
+    assert len(latencies) == 3
+    assert max(latencies) < HEARTBEAT_TIMEOUT + CHECK_INTERVAL + 0.1
+
+
+def offer_quiet_windows(watchdog, until, window=0.15, timeout=5.0):
+    # Stand-in control loop: heartbeats that leave the link to the watchdog, until until() holds
+    deadline = time.monotonic() + timeout
+    while not until() and time.monotonic() < deadline:
+        watchdog.heartbeat(time.monotonic() + window)
+        time.sleep(0.01)
+    assert until()
+
+
+def test_one_slow_reply_does_not_trip():
+    with CopleySimulator(baud_rate=9600) as sim:
+        dev = CopMotor(sim.port, baud_rate=sim.baud_rate)
+        sim.reply_delay = 0.2
+        with SafetyWatchdog(dev, -50, 50, interval=0.01) as watchdog:
+            offer_quiet_windows(watchdog, lambda: watchdog.read_failures > 0)
+            sim.reply_delay = 0.0005
+            checks = watchdog.checks
+            offer_quiet_windows(watchdog, lambda: watchdog.checks > checks)
+        assert not watchdog.tripped.is_set()
+        assert watchdog.read_failures == 0
+        assert dev.get('r0x90') == '9600'  # the late replies did not shift the link
+        dev.close()
+
+
+def test_repeated_read_failures_trip():
+    with CopleySimulator(baud_rate=9600) as sim:
+        dev = CopMotor(sim.port, baud_rate=sim.baud_rate)
+        sim.mute = True
+        with SafetyWatchdog(dev, -50, 50, interval=0.01) as watchdog:
+            offer_quiet_windows(watchdog, watchdog.tripped.is_set)
+        assert watchdog.reason.startswith('Watchdog could not read the drive 2 times in a row')
+        assert sim._registers[0x24] == 0
+        dev.close()
@@ -0,0 +1,193 @@
+import argparse
+import collections
+import logging
+import threading
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+
+from motor import (CopMotor, CopMotorError, MAX_DELTA_UNITS, MAX_VELOCITY_UNITS_SCALED, PORT, SCALE_FACTOR,
+                   SET_ACCELERATION_UNITS_FIXED, VELOCITY_UNIT)
+
+SEGMENT_DTYPE = np.dtype([('time', '<f8'), ('position', '<i8'), ('velocity', '<f8'), ('velocity_register', '<i8')])
+
+
+def sine(stroke: float, frequency: float, duration: float, rate: float = 1000.0) -> Tuple[np.ndarray, np.ndarray]:
+    # Oscillates between 0 and +stroke Units, starting at rest at 0.
+    t = np.arange(0.0, duration, 1.0 / rate)
+    return t, stroke / 2 * (1 - np.cos(2 * np.pi * frequency * t))
+
+
+def chirp(stroke: float, start_frequency: float, end_frequency: float, duration: float,
+          rate: float = 1000.0) -> Tuple[np.ndarray, np.ndarray]:
+    t = np.arange(0.0, duration, 1.0 / rate)
+    phase = 2 * np.pi * (start_frequency * t + (end_frequency - start_frequency) * t * t / (2 * duration))
+    return t, stroke / 2 * (1 - np.cos(phase))
+
+
+def load_trace(path: str) -> Tuple[np.ndarray, np.ndarray]:
+    # Two columns, time (s) and position (Units), comma or whitespace separated.
+    data = np.loadtxt(path, delimiter=',' if path.endswith('.csv') else None, ndmin=2)
+    return data[:, 0] - data[0, 0], data[:, 1]
+
+
+def pvt_segments(times: np.ndarray, positions: np.ndarray, segment_time: float = 0.05,
+                 scale_factor: float = SCALE_FACTOR) -> np.ndarray:
+    # Resample a position-vs-time profile into fixed-length segments in one vectorized pass.
+    # Each segment starts at `time` and ends at `position` (counts), traversed at `velocity` counts/s.
+    grid = np.arange(times[0], times[-1] + segment_time / 2, segment_time)
+    counts = np.rint(np.interp(grid, times, positions) / scale_factor).astype(np.int64)
+    if np.ptp(counts) * scale_factor > MAX_DELTA_UNITS:
+        raise ValueError(f" Waveform spans more than {MAX_DELTA_UNITS} Units")
+    velocity = np.abs(np.diff(counts)) / segment_time
+
+    segments = np.empty(len(grid) - 1, dtype=SEGMENT_DTYPE)
+    segments['time'] = grid[:-1] - grid[0]
+    segments['position'] = counts[1:]
+    segments['velocity'] = velocity
+    # Velocity limit for the move, never zero so a stationary segment is still a legal move
+    segments['velocity_register'] = np.maximum(np.ceil(velocity / VELOCITY_UNIT), 1).astype(np.int64)
+    if segments['velocity_register'].max() * scale_factor > MAX_VELOCITY_UNITS_SCALED:
+        raise ValueError(f" Waveform needs more than {MAX_VELOCITY_UNITS_SCALED} Units of velocity")
+    return segments
+
+
+def link_segment_time(dev, minimum: float = 0.05, margin: float = 2.0) -> float:
+    # Shortest segment the link keeps up with: every segment is a batch of up to three commands
+    # (target, velocity, trajectory), so allow margin times three measured round trips.
+    return max(minimum, margin * 3 * dev.measure_round_trip())
+
+
+class WaveformReport:
+    def __init__(self, sent: int, late: int, max_lateness: float, duration: float) -> None:
+        self.sent = sent
+        self.late = late
+        self.max_lateness = max_lateness
+        self.duration = duration
+
+    def log(self) -> None:
+        logging.info(f" Segments sent: {self.sent} in {self.duration:.2f} s")
+        logging.info(f" Late segments: {self.late}, worst lateness {self.max_lateness * 1000:.2f} ms")
+
+
+class WaveformStreamer:
+    # The drive's ASCII interface has no PVT buffer, so segments are streamed as absolute
+    # position moves whose velocity limit matches the segment. A refill thread keeps a
+    # queue of encoded segments above the low-water mark ahead of the dispatcher.
+
+    def __init__(self, dev, segments: np.ndarray, acceleration: float = SET_ACCELERATION_UNITS_FIXED,
+                 low_water: int = 50, chunk: int = 200, late_tolerance: float = 0.005) -> None:
+        self._dev = dev
+        self._segments = segments
+        self._acceleration = acceleration
+        self._low_water = low_water
+        self._chunk = chunk
+        self._late_tolerance = late_tolerance
+        self._queue = collections.deque()
+        self._ready = threading.Condition()
+        self._produced = 0
+        self._stop = threading.Event()
+
+    def _refill(self, origin: int) -> None:
+        segments = self._segments
+        while self._produced < len(segments) and not self._stop.is_set():
+            with self._ready:
+                self._ready.wait_for(lambda: len(self._queue) < self._low_water or self._stop.is_set())
+            block = segments[self._produced:self._produced + self._chunk]
+            targets = block['position'] + origin
+            encoded = [(float(start), [f's r0xCA {target}', f's r0xCB {velocity}', 't 1'])
+                       for start, target, velocity in zip(block['time'], targets, block['velocity_register'])]
+            with self._ready:
+                self._queue.extend(encoded)
+                self._produced += len(block)
+                self._ready.notify_all()
+
+    def _next(self):
+        with self._ready:
+            self._ready.wait_for(lambda: self._queue or self._produced >= len(self._segments) or self._stop.is_set())
+            if not self._queue:
+                return None
+            item = self._queue.popleft()
+            if len(self._queue) < self._low_water:
+                self._ready.notify_all()
+            return item
+
+    def stop(self) -> None:
+        self._stop.set()
+        with self._ready:
+            self._ready.notify_all()
+
+    def run(self, stop: Optional[threading.Event] = None) -> WaveformReport:
+        dev = self._dev
+        position = dev.get('r0x32')
+        if position is None:
+            raise CopMotorError(" Failed to get motor position.")
+        origin = int(position)
+        dev.set_profile_acceleration(self._acceleration)
+        dev.set_profile_deceleration(self._acceleration)
+        dev.set_mode_absolute_move()
+
+        refill = threading.Thread(target=self._refill, args=(origin,), name='waveform-refill', daemon=True)
+        refill.start()
+        sent = late = 0
+        max_lateness = 0.0
+        start = time.monotonic()
+        try:
+            while not self._stop.is_set() and not (stop is not None and stop.is_set()):
+                item = self._next()
+                if item is None:
+                    break
+                offset, commands = item
+                delay = start + offset - time.monotonic()
+                if delay > 0:
+                    self._stop.wait(delay)
+                lateness = time.monotonic() - start - offset
+                if lateness > self._late_tolerance:
+                    late += 1
+                max_lateness = max(max_lateness, lateness)
+                dev.pipeline(commands)
+                sent += 1
+            dev.wait_for_move()
+        finally:
+            self.stop()
+            refill.join()
+            dev.set_mode_relative_move()
+        return WaveformReport(sent, late, max_lateness, time.monotonic() - start)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Stream a smooth position waveform to the drive')
+    parser.add_argument('shape', choices=['sine', 'chirp', 'trace'], help='Waveform type')
+    parser.add_argument('-s', '--stroke', type=float, default=50, help='Peak-to-peak stroke (Units)')
+    parser.add_argument('-f', '--frequency', type=float, default=0.5, help='Frequency, or chirp start frequency (Hz)')
+    parser.add_argument('-F', '--end-frequency', type=float, default=1.0, help='Chirp end frequency (Hz)')
+    parser.add_argument('-t', '--desired-time', type=float, default=10, help='Duration (s)')
+    parser.add_argument('-i', '--input', help='Trace file with time and position columns')
+    parser.add_argument('-a', '--acceleration', type=float, default=SET_ACCELERATION_UNITS_FIXED, help='Move acceleration (Units)')
+    parser.add_argument('--segment-time', type=float, help="Segment length (s, default: sized from the link's round trip)")
+    parser.add_argument('-p', '--port', default=PORT, help='Serial port')
+    parser.add_argument('--fast-link', action='store_true', help='Upgrade the serial baud rate on connect')
+    args = parser.parse_args()
+
+    if args.shape == 'sine':
+        times, positions = sine(args.stroke, args.frequency, args.desired_time)
+    elif args.shape == 'chirp':
+        times, positions = chirp(args.stroke, args.frequency, args.end_frequency, args.desired_time)
+    else:
+        times, positions = load_trace(args.input)
+
+    dev = CopMotor(args.port, upgrade_baud_rate=args.fast_link)
+    try:
+        segment_time = args.segment_time or link_segment_time(dev)
+        logging.info(f" Segment length: {segment_time * 1000:.0f} ms")
+        segments = pvt_segments(times, positions, segment_time)
+        dev.configure_profile(1, args.acceleration, args.acceleration)
+        dev.enable_drive()
+        WaveformStreamer(dev, segments, args.acceleration).run().log()
+    except KeyboardInterrupt:
+        logging.info(" Interrupt detected. Attempting to disable drive...")
+    finally:
+        dev.disable_drive()